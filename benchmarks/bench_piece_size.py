@@ -0,0 +1,134 @@
+# File: bench_piece_size.py
+"""Compare piece sizes for a torrent: metainfo size, per-torrent state, transfer time and memory.
+
+The transfer runs the real PieceManager read, verify and write paths between a seeding
+and a downloading copy on local disk. Network cost is modeled on top of it from the
+number of piece requests, since the peer protocol sends one REQUEST per piece and waits
+for the whole piece before asking for the next one on that connection.
+
+    python benchmarks/bench_piece_size.py --size-mb 256 --rtt-ms 50 --bandwidth-mbps 100
+"""
+import os
+import sys
+import math
+import time
+import shutil
+import argparse
+import logging
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add project root to path
+
+from src.peer.torrent_maker import create_torrent_file, choose_piece_size
+from src.peer.metainfo import parse_torrent
+from src.peer.piece_manager import PieceManager
+from src.peer.buffer_pool import buffer_pool
+
+CANDIDATE_SIZES = [32 * 1024 * 2 ** i for i in range(10)]  # 32 KB .. 16 MB
+CONTENT_SIZES = [1, 16, 256, 4 * 1024, 64 * 1024, 200 * 1024]  # MB, for the selection table
+
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB", "GB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.0f} TB"
+
+def selection_table():
+    print("Automatic piece size by content size")
+    print(f"{'content':>10} {'piece':>8} {'pieces':>8} {'hashes':>9} {'bitfield msg':>13} {'piece state':>12}")
+    for size_mb in CONTENT_SIZES:
+        total_length = size_mb * 1024 * 1024
+        piece_size = choose_piece_size(total_length)
+        pieces = math.ceil(total_length / piece_size)
+        # BITFIELD:<hex> on the wire, one have flag per piece in PieceManager.have_pieces
+        bitfield_bytes = len("BITFIELD:") + math.ceil(pieces / 8) * 2
+        state_bytes = sys.getsizeof([False] * pieces)
+        print(f"{format_size(total_length):>10} {format_size(piece_size):>8} {pieces:>8} {format_size(pieces * 20):>9} "
+              f"{format_size(bitfield_bytes):>13} {format_size(state_bytes):>12}")
+    print()
+
+def transfer(torrent_path, seed_dir, download_dir):
+    """Move every piece from a seeding PieceManager to a fresh one, returning (seconds, peak traced bytes)."""
+    metainfo = parse_torrent(torrent_path)
+    seeder = PieceManager(metainfo, "bench-seed", seed_dir)
+    tracemalloc.start()
+    start = time.perf_counter()
+    leecher = PieceManager(metainfo, "bench-leech", download_dir)
+    for piece_index in range(leecher.total_pieces):
+        buffer = buffer_pool.acquire(seeder.expected_piece_length(piece_index))
+        try:
+            piece_data = seeder.read_piece(piece_index, out=buffer)
+            if not leecher.piece_complete(piece_index, piece_data):
+                raise RuntimeError(f"Piece {piece_index} failed to transfer")
+        finally:
+            buffer_pool.release(buffer)
+    elapsed = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    seeder.close()
+    leecher.close()
+    return elapsed, peak_bytes
+
+def transfer_table(args):
+    total_length = args.size_mb * 1024 * 1024
+    work_dir = tempfile.mkdtemp(prefix="bench_piece_size_")
+    try:
+        seed_dir = os.path.join(work_dir, "seed")
+        os.makedirs(seed_dir)
+        files = []
+        file_length = total_length // args.files
+        for i in range(args.files):
+            path = os.path.join(seed_dir, f"file{i}.bin")
+            with open(path, "wb") as f:
+                remaining = file_length if i < args.files - 1 else total_length - file_length * (args.files - 1)
+                while remaining:
+                    chunk = min(remaining, 4 * 1024 * 1024)
+                    f.write(os.urandom(chunk))
+                    remaining -= chunk
+            files.append(path)
+
+        auto_size = choose_piece_size(total_length)
+        print(f"Transfer of {format_size(total_length)} in {args.files} files, {args.rtt_ms:.0f} ms RTT, "
+              f"{args.bandwidth_mbps:.0f} Mbit/s, {args.connections} connections (auto piece size {format_size(auto_size)})")
+        print(f"{'piece':>8} {'pieces':>8} {'torrent':>9} {'create s':>9} {'disk s':>8} {'network s':>10} "
+              f"{'total s':>8} {'peak mem':>9}")
+        for piece_size in CANDIDATE_SIZES:
+            if piece_size > total_length and piece_size != auto_size:
+                continue
+            torrent_path = os.path.join(work_dir, f"{piece_size}.torrent")
+            start = time.perf_counter()
+            create_torrent_file(files, "http://localhost:8000", torrent_path, piece_size=piece_size)
+            create_seconds = time.perf_counter() - start
+            disk_seconds, peak_bytes = transfer(torrent_path, seed_dir, os.path.join(work_dir, f"dl{piece_size}"))
+            shutil.rmtree(os.path.join(work_dir, f"dl{piece_size}"))
+            pieces = math.ceil(total_length / piece_size)
+            # Each connection waits one round trip per piece, the payload shares the link
+            network_seconds = (math.ceil(pieces / args.connections) * args.rtt_ms / 1000 +
+                               total_length * 8 / (args.bandwidth_mbps * 1000 * 1000))
+            marker = " <- auto" if piece_size == auto_size else ""
+            print(f"{format_size(piece_size):>8} {pieces:>8} {format_size(os.path.getsize(torrent_path)):>9} "
+                  f"{create_seconds:>9.2f} {disk_seconds:>8.2f} {network_seconds:>10.2f} "
+                  f"{disk_seconds + network_seconds:>8.2f} {format_size(peak_bytes):>9}{marker}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark torrent piece sizes")
+    parser.add_argument("--size-mb", type=int, default=64, help="Content size to transfer")
+    parser.add_argument("--files", type=int, default=4, help="Number of files the content is split into")
+    parser.add_argument("--rtt-ms", type=float, default=50.0, help="Modeled round trip time per piece request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="Modeled download bandwidth")
+    parser.add_argument("--connections", type=int, default=4, help="Peers downloading in parallel")
+    parser.add_argument("--skip-transfer", action="store_true", help="Only print the piece size selection table")
+    args = parser.parse_args()
+    # A fresh download logs every missing file while checking existing pieces
+    logging.disable(logging.ERROR)
+
+    selection_table()
+    if not args.skip_transfer:
+        transfer_table(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# File: bench_tracker_announce.py
+"""Measure tracker announce throughput and latency for each storage mode.
+
+Announces go through the real Flask handler via the test client, from several threads
+at once, spread over a number of torrents with a fixed swarm size each. Network and
+HTTP parsing costs are left out so the storage path dominates. Meanwhile a reader polls
+get_torrents() like the tracker UI does, to show whether reads hold up announces.
+
+    python benchmarks/bench_tracker_announce.py --threads 8 --announces 4000 --torrents 20
+"""
+import os
+import sys
+import time
+import threading
+import shutil
+import random
+import argparse
+import logging
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add project root to path
+
+from src.tracker.tracker import Tracker
+
+def announce_worker(tracker, announces, args, seed):
+    client = tracker.app.test_client()
+    rng = random.Random(seed)
+    latencies = []
+    response_bytes = 0
+    for _ in range(announces):
+        params = {
+            "peer_id": f"peer{rng.randrange(args.swarm_size)}",
+            "torrent_hash": f"torrent{rng.randrange(args.torrents)}",
+            "port": 6881,
+            "event": "",
+            "downloaded": rng.randrange(1 << 30),
+            "uploaded": rng.randrange(1 << 30),
+            "numwant": args.numwant,
+            "compact": int(args.compact),
+        }
+        start = time.perf_counter()
+        response = client.get("/announce", query_string=params)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"Announce failed: {response.get_json()}")
+        response_bytes += len(response.data)
+    return latencies, response_bytes
+
+def poll_torrents(tracker, interval, done, latencies):
+    while not done.wait(interval):
+        start = time.perf_counter()
+        tracker.get_torrents()
+        latencies.append(time.perf_counter() - start)
+
+def run(storage, args, work_dir):
+    tracker = Tracker(os.path.join(work_dir, f"{storage}.db"), storage=storage)
+    per_thread = args.announces // args.threads
+    done = threading.Event()
+    poll_latencies = []
+    poller = threading.Thread(target=poll_torrents, args=(tracker, args.poll_ms / 1000, done, poll_latencies))
+    start = time.perf_counter()
+    if args.poll_ms:
+        poller.start()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        futures = [executor.submit(announce_worker, tracker, per_thread, args, seed) for seed in range(args.threads)]
+        results = [future.result() for future in futures]
+    latencies = sorted(latency for thread_latencies, _ in results for latency in thread_latencies)
+    response_size = sum(response_bytes for _, response_bytes in results) / len(latencies)
+    elapsed = time.perf_counter() - start
+    done.set()
+    if args.poll_ms:
+        poller.join()
+    poll_median = statistics.median(poll_latencies) if poll_latencies else 0
+    stats = tracker.stats()
+    batching = stats["writer"]["writes_per_commit"] if "writer" in stats else 0
+    cache_hits = stats["response_cache"]["hit_rate"] if "response_cache" in stats else 0
+    return (len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1],
+            poll_median, batching, response_size, cache_hits)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tracker announces")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent announcing threads")
+    parser.add_argument("--announces", type=int, default=4000, help="Announces in total")
+    parser.add_argument("--torrents", type=int, default=20, help="Torrents the announces are spread over")
+    parser.add_argument("--swarm-size", type=int, default=200, help="Peers per torrent")
+    parser.add_argument("--numwant", type=int, default=50, help="Peers asked for per announce")
+    parser.add_argument("--compact", action="store_true", help="Ask for packed 6-byte peer addresses")
+    parser.add_argument("--poll-ms", type=int, default=250, help="get_torrents() polling interval, 0 disables it")
+    parser.add_argument("--storage", nargs="+", default=["sqlite", "memory"], help="Storage modes to compare")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    work_dir = tempfile.mkdtemp(prefix="bench_tracker_")
+    try:
+        print(f"{args.announces} announces from {args.threads} threads over {args.torrents} torrents "
+              f"of up to {args.swarm_size} peers, numwant {args.numwant}{', compact' if args.compact else ''}")
+        print(f"{'storage':>8} {'announces/s':>12} {'median ms':>10} {'p99 ms':>8} {'get_torrents ms':>16} "
+              f"{'writes/commit':>14} {'bytes/response':>15} {'cache hits':>11}")
+        for storage in args.storage:
+            rate, median, p99, poll_median, batching, response_size, cache_hits = run(storage, args, work_dir)
+            print(f"{storage:>8} {rate:>12.0f} {median * 1000:>10.2f} {p99 * 1000:>8.2f} {poll_median * 1000:>16.2f} "
+                  f"{batching:>14.1f} {response_size:>15.0f} {cache_hits:>11.0%}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# File: announce_scheduler.py
+import time
+import random
+import socket
+import threading
+import logging
+import requests
+import bencodepy
+from concurrent.futures import Future, ThreadPoolExecutor
+from src.peer.config import (DEFAULT_ANNOUNCE_INTERVAL, ANNOUNCE_JITTER, ANNOUNCE_BATCH_DELAY, ANNOUNCE_BATCH_WINDOW,
+                             ANNOUNCE_BATCH_MAX, ANNOUNCE_WORKERS, ANNOUNCE_TIMEOUT, ANNOUNCE_RETRY_DELAY)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ACTIVE_STATES = ('downloading', 'seeding')
+
+def parse_compact_peers(packed, address_size):
+    """Peers from packed 6-byte IPv4 or 18-byte IPv6 addresses, named ip:port since no peer id is sent."""
+    family = socket.AF_INET if address_size == 6 else socket.AF_INET6
+    peers = []
+    for offset in range(0, len(packed) - address_size + 1, address_size):
+        ip = socket.inet_ntop(family, packed[offset:offset + address_size - 2])
+        port = int.from_bytes(packed[offset + address_size - 2:offset + address_size], "big")
+        peers.append({"peer_id": f"{ip}:{port}", "ip": ip, "port": port})
+    return peers
+
+def decode_reply(reply):
+    """A tracker's reply to one announce, with compact peer addresses unpacked into peer dicts."""
+    if not any(isinstance(key, bytes) for key in reply):
+        return reply
+    reply = {key.decode(): value for key, value in reply.items()}
+    if "failure reason" in reply:
+        reply["failure reason"] = reply["failure reason"].decode(errors="replace")
+        return reply
+    reply["peers"] = parse_compact_peers(reply.get("peers", b""), 6) + parse_compact_peers(reply.get("peers6", b""), 18)
+    return reply
+
+def decode_response(response):
+    if response.headers.get("Content-Type", "").startswith("application/json"):
+        return response.json()
+    return bencodepy.decode(response.content)
+
+class AnnounceScheduler:
+    """Sends the tracker announces of every Client in the process, batched per tracker over keep-alive sessions.
+
+    announce() queues a lifecycle event and waits for its reply; it joins the batch going to
+    the same tracker after ANNOUNCE_BATCH_DELAY. Registered clients are re-announced on the
+    tracker's interval, and any within ANNOUNCE_BATCH_WINDOW of being due ride along in a
+    batch to their tracker, so a node seeding many torrents sends a few /announce_batch
+    requests instead of one announce per torrent. Trackers without /announce_batch get
+    single announces over the same session.
+    """
+
+    def __init__(self, delay=ANNOUNCE_BATCH_DELAY, window=ANNOUNCE_BATCH_WINDOW, max_batch=ANNOUNCE_BATCH_MAX):
+        self.delay = delay
+        self.window = window
+        self.max_batch = max_batch
+        self.due = {}  # registered client -> (earliest, target) time of its next re-announce
+        self.pending = {}  # tracker_url -> {client: [event, futures waiting for the reply]}
+        self.queued_at = {}  # tracker_url -> time its oldest pending announce was queued
+        self.sending = set()  # Trackers with a batch in flight, at most one each so events stay in order
+        self.sessions = {}  # tracker_url -> requests.Session
+        self.unbatched = set()  # Trackers that answered /announce_batch with 404
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=ANNOUNCE_WORKERS, thread_name_prefix="Announce")
+        self.thread = None
+        self.batches = 0
+        self.announces = 0
+
+    def announce(self, client, event):
+        """Send one announce for client and return the tracker's decoded reply."""
+        future = Future()
+        with self.condition:
+            self._queue(client, event, future)
+            self._start()
+            self.condition.notify()
+        return future.result()
+
+    def register(self, client):
+        """Re-announce client on its tracker's interval until it stops."""
+        with self.condition:
+            if client not in self.due:
+                self._reschedule(client, client.last_announce, client.announce_interval, client.min_announce_interval)
+            self._start()
+            self.condition.notify()
+
+    def unregister(self, client):
+        with self.condition:
+            self.due.pop(client, None)
+
+    def _start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="AnnounceScheduler", daemon=True)
+            self.thread.start()
+
+    def _queue(self, client, event, future=None):
+        tracker_url = client.metainfo.get('announce', '')
+        pending = self.pending.setdefault(tracker_url, {})
+        if not pending:
+            self.queued_at[tracker_url] = time.time()
+        entry = pending.setdefault(client, [event, []])
+        if event:
+            entry[0] = event  # A lifecycle event replaces a queued re-announce
+        if future is not None:
+            entry[1].append(future)
+
+    def _reschedule(self, client, last_announce, interval, min_interval):
+        target = last_announce + interval * random.uniform(1 - ANNOUNCE_JITTER, 1)
+        earliest = last_announce + min_interval
+        self.due[client] = (earliest, max(target, earliest))
+
+    def _run(self):
+        with self.condition:
+            while True:
+                now = time.time()
+                for client, (_, target) in list(self.due.items()):
+                    if target > now:
+                        continue
+                    if not client.running or client.state not in ACTIVE_STATES + ('paused',):
+                        del self.due[client]
+                    elif client.paused:
+                        self._reschedule(client, now, client.announce_interval, client.min_announce_interval)
+                    else:
+                        self._queue(client, "")
+                        self.due[client] = (float("inf"), float("inf"))  # Until its reply reschedules it
+                wake = min([target for _, target in self.due.values()] + [now + 60])
+                for tracker_url, pending in self.pending.items():
+                    if not pending or tracker_url in self.sending:
+                        continue
+                    send_at = self.queued_at[tracker_url] + self.delay
+                    if send_at <= now:
+                        self._send_batch(tracker_url, now)
+                    else:
+                        wake = min(wake, send_at)
+                self.condition.wait(max(0.0, wake - now))
+
+    def _send_batch(self, tracker_url, now):
+        """Take up to max_batch pending announces for a tracker, plus nearly due re-announces, and send them."""
+        pending = self.pending[tracker_url]
+        batch = []
+        torrents = set()  # Clients of the same torrent go in separate batches, replies are keyed by torrent
+        for client in list(pending):
+            if len(batch) >= self.max_batch:
+                break
+            if client.metainfo["torrent_hash"] in torrents:
+                continue
+            event, futures = pending.pop(client)
+            batch.append((client, event, futures))
+            torrents.add(client.metainfo["torrent_hash"])
+        for client, (earliest, target) in self.due.items():
+            if len(batch) >= self.max_batch:
+                break
+            if (client.metainfo.get('announce', '') == tracker_url and earliest <= now and target - self.window <= now
+                    and client.metainfo["torrent_hash"] not in torrents and client.running and not client.paused
+                    and client.state in ACTIVE_STATES):
+                batch.append((client, "", []))
+                torrents.add(client.metainfo["torrent_hash"])
+        for client, _, _ in batch:
+            if client in self.due:
+                self.due[client] = (float("inf"), float("inf"))
+        if pending:
+            self.queued_at[tracker_url] = now
+        self.sending.add(tracker_url)
+        self.batches += 1
+        self.announces += len(batch)
+        self.executor.submit(self._send, tracker_url, batch)
+
+    def _send(self, tracker_url, batch):
+        try:
+            try:
+                replies = self._post(tracker_url, [(client, event) for client, event, _ in batch])
+            except Exception as e:
+                replies = [e] * len(batch)
+            now = time.time()
+            for (client, event, futures), reply in zip(batch, replies):
+                with self.condition:
+                    if client in self.due:
+                        if isinstance(reply, Exception) or "failure reason" in reply:
+                            self._reschedule(client, now, ANNOUNCE_RETRY_DELAY, 0)
+                        else:
+                            self._reschedule(client, now, reply.get("interval", DEFAULT_ANNOUNCE_INTERVAL),
+                                             reply.get("min interval", 0))
+                for future in futures:
+                    if isinstance(reply, Exception):
+                        future.set_exception(reply)
+                    else:
+                        future.set_result(reply)
+                if futures:
+                    continue
+                # Re-announces nobody waits for are handed to their client here
+                if isinstance(reply, Exception):
+                    logging.error(f"Re-announce of {client.metainfo['torrent_hash']} failed: {reply}")
+                elif "failure reason" in reply:
+                    logging.warning(f"Tracker refused re-announce of {client.metainfo['torrent_hash']}: {reply['failure reason']}")
+                else:
+                    try:
+                        client.handle_announce(event, reply)
+                    except Exception as e:
+                        logging.error(f"Handling re-announce of {client.metainfo['torrent_hash']} failed: {e}")
+        finally:
+            with self.condition:
+                self.sending.discard(tracker_url)
+                self.condition.notify()
+
+    def _post(self, tracker_url, announces):
+        """Announce (client, event) pairs to a tracker and return a decoded reply or an exception for each."""
+        session = self.sessions.get(tracker_url)
+        if session is None:
+            session = self.sessions[tracker_url] = requests.Session()
+        params = [client.announce_params(event) for client, event in announces]
+        if tracker_url not in self.unbatched:
+            logging.info(f"Batch announce of {len(params)} torrents to {tracker_url}")
+            response = session.post(tracker_url + "/announce_batch", json={"compact": 1, "torrents": params},
+                                    timeout=ANNOUNCE_TIMEOUT)
+            if response.status_code == 404:
+                logging.info(f"Tracker {tracker_url} has no batch announces, announcing one torrent at a time")
+                self.unbatched.add(tracker_url)
+            elif response.status_code != 200:
+                raise RuntimeError(f"Tracker returned {response.status_code}: {response.text}")
+            else:
+                torrents = decode_response(response)
+                torrents = torrents.get(b"torrents", torrents.get("torrents", {}))
+                replies = []
+                for announce in params:
+                    torrent_hash = announce["torrent_hash"]
+                    reply = torrents.get(torrent_hash.encode(), torrents.get(torrent_hash))
+                    replies.append(decode_reply(reply) if reply is not None
+                                   else RuntimeError(f"Tracker sent no reply for {torrent_hash}"))
+                return replies
+        replies = []
+        for announce in params:
+            try:
+                response = session.get(tracker_url + "/announce", params={**announce, "compact": 1},
+                                       timeout=ANNOUNCE_TIMEOUT)
+                if response.status_code != 200:
+                    raise RuntimeError(f"Tracker returned {response.status_code}: {response.text}")
+                replies.append(decode_reply(decode_response(response)))
+            except Exception as e:
+                replies.append(e)
+        return replies
+
+    def stats(self):
+        return {"batches": self.batches, "announces": self.announces,
+                "announces_per_batch": self.announces / self.batches if self.batches else 0}
+
+announce_scheduler = AnnounceScheduler()
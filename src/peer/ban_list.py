@@ -0,0 +1,71 @@
+# File: ban_list.py
+import time
+import threading
+import logging
+from src.peer.config import BAN_SCORE, BAN_DURATION, PERMANENT_BAN_AFTER
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class BanList:
+    """Scores peers for sending data that failed hash checks and bans repeat offenders.
+
+    A peer whose score reaches BAN_SCORE is banned for BAN_DURATION, doubling with
+    every further ban, and for good after PERMANENT_BAN_AFTER bans.
+    """
+
+    def __init__(self):
+        self.peers = {}  # peer_id -> {"ip", "port", "score", "bans", "banned_until"}
+        self.lock = threading.Lock()
+
+    def _entry(self, peer_id, ip=None, port=None):
+        entry = self.peers.setdefault(peer_id, {"ip": ip, "port": port, "score": 0.0, "bans": 0, "banned_until": 0.0})
+        if ip is not None:
+            entry["ip"], entry["port"] = ip, port
+        return entry
+
+    def record_failure(self, peer_id, ip=None, port=None, weight=1.0):
+        """Blame a peer for bad data; weight is its share when several peers sent parts of a bad piece."""
+        with self.lock:
+            entry = self._entry(peer_id, ip, port)
+            entry["score"] += weight
+            logging.warning(f"Hash failure blamed on {peer_id}: score {entry['score']:.2f}/{BAN_SCORE}")
+            if entry["score"] < BAN_SCORE or entry["banned_until"] == float("inf"):
+                return
+            entry["bans"] += 1
+            entry["score"] = 0.0
+            if entry["bans"] >= PERMANENT_BAN_AFTER:
+                entry["banned_until"] = float("inf")
+                logging.warning(f"Permanently banned peer {peer_id} after {entry['bans']} bans")
+            else:
+                duration = BAN_DURATION * 2 ** (entry["bans"] - 1)
+                entry["banned_until"] = time.time() + duration
+                logging.warning(f"Banned peer {peer_id} for {duration}s")
+
+    def record_success(self, peer_id):
+        # Good pieces slowly earn back trust, so an occasional bad block is forgiven
+        with self.lock:
+            entry = self.peers.get(peer_id)
+            if entry and entry["score"] > 0:
+                entry["score"] = max(0.0, entry["score"] - 0.1)
+
+    def is_banned(self, peer_id):
+        with self.lock:
+            entry = self.peers.get(peer_id)
+            return bool(entry) and entry["banned_until"] > time.time()
+
+    def status(self, peer_id):
+        """Short ban state for the peer list."""
+        with self.lock:
+            entry = self.peers.get(peer_id)
+            if not entry or entry["banned_until"] <= time.time():
+                return "OK" if not entry or entry["score"] == 0 else f"Suspect ({entry['score']:.1f})"
+            if entry["banned_until"] == float("inf"):
+                return "Banned"
+            return f"Banned ({int(entry['banned_until'] - time.time())}s)"
+
+    def banned_peers(self):
+        """(peer_id, ip, port) of every currently banned peer."""
+        now = time.time()
+        with self.lock:
+            return [(peer_id, entry["ip"], entry["port"]) for peer_id, entry in self.peers.items()
+                    if entry["banned_until"] > now]
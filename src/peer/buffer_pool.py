@@ -0,0 +1,76 @@
+# File: buffer_pool.py
+import threading
+import logging
+from src.peer.config import MAX_BUFFER_MEMORY
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class BufferPool:
+    """Recycles piece-sized buffers and caps the memory held by in-flight pieces.
+
+    acquire() blocks while the budget is used up, so downloads and uploads wait
+    for a buffer instead of growing memory without limit.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.free = {}  # buffer size -> idle buffers ready for reuse
+        self.free_bytes = 0
+        self.in_use_bytes = 0
+        self.peak_bytes = 0
+        self.waits = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            # A buffer larger than the whole budget is still handed out when nothing else is in use
+            if self.in_use_bytes > 0 and self.in_use_bytes + size > self.max_bytes:
+                self.waits += 1
+                logging.debug(f"Waiting for {size} bytes of buffer memory ({self.in_use_bytes}/{self.max_bytes} in use)")
+                while self.in_use_bytes > 0 and self.in_use_bytes + size > self.max_bytes:
+                    self.condition.wait()
+            return self._take(size)
+
+    def try_acquire(self, size):
+        """Like acquire(), but returns None instead of waiting when the budget is used up."""
+        with self.condition:
+            if self.in_use_bytes > 0 and self.in_use_bytes + size > self.max_bytes:
+                return None
+            return self._take(size)
+
+    def _take(self, size):
+        # Called with the condition held
+        self.in_use_bytes += size
+        self.peak_bytes = max(self.peak_bytes, self.in_use_bytes)
+        idle = self.free.get(size)
+        if idle:
+            self.free_bytes -= size
+            return idle.pop()
+        # Drop idle buffers of other sizes so in-use plus idle memory stays within budget
+        while self.free_bytes and self.in_use_bytes + self.free_bytes > self.max_bytes:
+            other_size = next(s for s, buffers in self.free.items() if buffers)
+            self.free[other_size].pop()
+            self.free_bytes -= other_size
+        return bytearray(size)
+
+    def release(self, buffer):
+        size = len(buffer)
+        with self.condition:
+            self.in_use_bytes -= size
+            if self.in_use_bytes + self.free_bytes + size <= self.max_bytes:
+                self.free.setdefault(size, []).append(buffer)
+                self.free_bytes += size
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                "in_use_bytes": self.in_use_bytes,
+                "peak_bytes": self.peak_bytes,
+                "idle_bytes": self.free_bytes,
+                "max_bytes": self.max_bytes,
+                "waits": self.waits
+            }
+
+# Shared by every torrent in the process so the cap is global
+buffer_pool = BufferPool(MAX_BUFFER_MEMORY)
@@ -20,6 +20,10 @@ sys.path.append(current_dir)  # Add current directory to path
 from peer import Peer
 from piece_manager import PieceManager
 from metainfo import parse_torrent
+from src.peer.config import READ_AHEAD_PIECES, TRACKER_NUMWANT, DEFAULT_ANNOUNCE_INTERVAL
+from src.peer.announce_scheduler import announce_scheduler
+from src.peer.buffer_pool import buffer_pool
+from src.peer.ban_list import BanList
 
 PEER_PORT = 6881
 EXPECTED_PORT_RANGE = range(6881, 6891)  # Standard BitTorrent ports
@@ -41,6 +45,7 @@ class PeerStats:
         self.pieces_uploaded = 0
         self.bytes_downloaded = 0
         self.bytes_uploaded = 0
+        self.bad_blocks = 0  # Blocks that failed Merkle verification, blamed on this peer
         self.last_update = time.time()
 
     def update_download(self, success, elapsed_time, piece_size):
@@ -97,6 +102,11 @@ class Client:
         self.paused = False
         self.peers = []
         self.upload_server = None
+        self.upload_thread = None
+        self.announce_interval = DEFAULT_ANNOUNCE_INTERVAL  # Both as last sent by the tracker
+        self.min_announce_interval = 0
+        self.last_announce = 0.0
+        self.announced = False  # Whether the tracker counts us in the swarm, from "started" until "stopped"
         self.port = self.find_port(port)
         self.db_lock = threading.Lock()
         self.bytes_downloaded = 0
@@ -113,6 +123,8 @@ class Client:
         self.upload_slot_lock = threading.Lock()
         self.last_slot_rotation = time.time()
         self.slot_rotation_interval = 30 
+        self.last_upload_piece = {}  # IP -> (last piece served, time), used to detect sequential runs
+        self.ban_list = BanList()
         logging.info(f"Client initialized: torrent={torrent_file}, base_path={base_path}, port={self.port}")
         threading.Thread(target=self.cleanup_peer_stats, daemon=True).start()
 
@@ -131,12 +143,14 @@ class Client:
         # Get available pieces from each peer
         for peer in self.peers:
             peer_id = peer["peer_id"]
+            if self.ban_list.is_banned(peer_id):
+                continue
             if peer_id not in available_pieces_by_peer:
                 # Create a mock peer to get bitfield
                 mock_peer = Peer(peer_id, peer["ip"], peer["port"], self.piece_manager)
                 available = None
                 try:
-                    if mock_peer.connect():
+                    if mock_peer.connect(self.peer_id, self.port):
                         available = mock_peer.available_pieces
                         mock_peer.close()
                 except:
@@ -199,6 +213,23 @@ class Client:
                     raise RuntimeError(f"No available ports found after trying {max_attempts} ports")
         raise RuntimeError("No available ports")
 
+    def announce_params(self, event):
+        """Parameters of one announce for this torrent, in the form the tracker's announce endpoints take."""
+        magnet = f"magnet:?xt=urn:btih:{self.metainfo['torrent_hash']}&tr={urllib.parse.quote(self.metainfo['announce'])}"
+        return {
+            "torrent_hash": self.metainfo["torrent_hash"],
+            "peer_id": self.peer_id,
+            "port": self.port,
+            "downloaded": sum(self.piece_manager.have_pieces) * self.metainfo["piece_length"],
+            "uploaded": self.bytes_uploaded,
+            "download_rate": self.get_speed(upload=False),
+            "upload_rate": self.get_speed(upload=True),
+            "event": event,
+            "seeding": self.piece_manager.all_pieces_downloaded(),  # Explicitly indicate seeding state
+            "magnet": magnet,
+            "numwant": TRACKER_NUMWANT
+        }
+
     def contact_tracker(self, event="started"):
         max_retries = 3
         retry_delay = 10
@@ -208,68 +239,77 @@ class Client:
             return
         for attempt in range(max_retries):
             try:
-                magnet = f"magnet:?xt=urn:btih:{self.metainfo['torrent_hash']}&tr={urllib.parse.quote(self.metainfo['announce'])}"
-                params = {
-                    "torrent_hash": self.metainfo["torrent_hash"],
-                    "peer_id": self.peer_id,
-                    "port": self.port,
-                    "downloaded": sum(self.piece_manager.have_pieces) * self.metainfo["piece_length"],
-                    "uploaded": self.bytes_uploaded,
-                    "download_rate": self.get_speed(upload=False),
-                    "upload_rate": self.get_speed(upload=True),
-                    "event": event,
-                    "seeding": self.piece_manager.all_pieces_downloaded(),  # Explicitly indicate seeding state
-                    "magnet": magnet
-                }
-                logging.info(f"Contacting tracker {tracker_url}/announce with params: {params}")
-                response = requests.get(tracker_url + "/announce", params=params, timeout=30)
-                if response.status_code == 200:
-                    new_peers = response.json().get("peers", [])
-                    logging.info(f"Raw tracker response: {new_peers}")
-                    self.peers.clear()  # Clear old peers
-                    peer_ids = set()
-                    added_peers = []
-                    for p in new_peers[:4]:  # Limit to 4 peers
-                        if p["peer_id"] == self.peer_id:
-                            logging.debug(f"Skipping own peer: {p['peer_id']}")
-                            continue
-                        if p["peer_id"] in peer_ids:
-                            logging.debug(f"Skipping duplicate peer: {p['peer_id']}")
-                            continue
-                        port = p.get("port", 0)
-                        if port in EXPECTED_PORT_RANGE:  # 6881–6890
-                            logging.info(f"Accepting peer {p['peer_id']} on expected port {port}")
-                            self.peers.append(p)
-                            added_peers.append(p)
-                            peer_ids.add(p["peer_id"])
-                        elif port in EPHEMERAL_PORT_RANGE:  # 49152–65535
-                            logging.info(f"Accepting peer {p['peer_id']} on ephemeral port {port}")
-                            self.peers.append(p)
-                            added_peers.append(p)
-                            peer_ids.add(p["peer_id"])
-                        else:
-                            logging.warning(f"Skipping peer with suspicious port: {p['peer_id']} ({p['ip']}:{port})")
-                    logging.info(f"Added peers: {[f'{p['ip']}:{p['port']}' for p in added_peers]}")
-                    for peer in added_peers:
-                        if peer["peer_id"] not in self.peer_stats:
-                            self.peer_stats[peer["peer_id"]] = PeerStats(peer["peer_id"], peer["ip"], peer["port"])
-                        if not self.peer_priority.full():
-                            self.peer_priority.put(peer["peer_id"])
-                    self.state = {'started': 'downloading', 'completed': 'seeding', 'stopped': 'stopped'}.get(event, self.state)
-                    if not added_peers and event != "stopped":
+                # Sent with the announces of other torrents to the same tracker, see AnnounceScheduler
+                logging.info(f"Announcing {event or 'update'} to tracker {tracker_url}")
+                reply = announce_scheduler.announce(self, event)
+                if "failure reason" in reply:
+                    logging.warning(f"Tracker attempt {attempt + 1} refused: {reply['failure reason']}")
+                else:
+                    seeding = self.piece_manager.all_pieces_downloaded()
+                    added_peers = self.handle_announce(event, reply)
+                    if not added_peers and event == "started" and not seeding:
+                        # Only worth asking again right away when starting, and no sooner than the tracker allows
                         logging.warning("No valid peers added, retrying...")
+                        if attempt < max_retries - 1:
+                            time.sleep(max(retry_delay, self.min_announce_interval))
                         continue
                     return
-                else:
-                    logging.warning(f"Tracker attempt {attempt + 1} returned {response.status_code}: {response.text}")
-            except requests.exceptions.RequestException as e:
+            except (requests.exceptions.RequestException, RuntimeError, ValueError) as e:
                 logging.error(f"Tracker attempt {attempt + 1} failed: {e}")
             if attempt < max_retries - 1:
                 logging.info(f"Retrying tracker in {retry_delay} seconds...")
                 time.sleep(retry_delay)
         logging.error(f"Failed to contact tracker after {max_retries} attempts")
+
+    def handle_announce(self, event, reply):
+        """Take the peers and interval from a tracker reply and return the peers added."""
+        self.last_announce = time.time()
+        if event:
+            self.announced = event != 'stopped'
+        new_peers = reply.get("peers", [])
+        self.announce_interval = reply.get("interval", DEFAULT_ANNOUNCE_INTERVAL)
+        self.min_announce_interval = reply.get("min interval", 0)
+        logging.info(f"Raw tracker response: {new_peers}")
+        self.peers.clear()  # Clear old peers
+        peer_ids = set()
+        added_peers = []
+        for p in new_peers:
+            if len(added_peers) >= 4:  # Limit to 4 peers
+                break
+            if p["peer_id"] == self.peer_id:
+                logging.debug(f"Skipping own peer: {p['peer_id']}")
+                continue
+            if p["peer_id"] in peer_ids:
+                logging.debug(f"Skipping duplicate peer: {p['peer_id']}")
+                continue
+            port = p.get("port", 0)
+            if port in EXPECTED_PORT_RANGE:  # 6881–6890
+                logging.info(f"Accepting peer {p['peer_id']} on expected port {port}")
+                self.peers.append(p)
+                added_peers.append(p)
+                peer_ids.add(p["peer_id"])
+            elif port in EPHEMERAL_PORT_RANGE:  # 49152–65535
+                logging.info(f"Accepting peer {p['peer_id']} on ephemeral port {port}")
+                self.peers.append(p)
+                added_peers.append(p)
+                peer_ids.add(p["peer_id"])
+            else:
+                logging.warning(f"Skipping peer with suspicious port: {p['peer_id']} ({p['ip']}:{port})")
+        logging.info(f"Added peers: {[f'{p['ip']}:{p['port']}' for p in added_peers]}")
+        for peer in added_peers:
+            if peer["peer_id"] not in self.peer_stats:
+                self.peer_stats[peer["peer_id"]] = PeerStats(peer["peer_id"], peer["ip"], peer["port"])
+            if not self.peer_priority.full():
+                self.peer_priority.put(peer["peer_id"])
+        seeding = self.piece_manager.all_pieces_downloaded()
+        self.state = {'started': 'seeding' if seeding else 'downloading', 'completed': 'seeding',
+                      'stopped': 'stopped'}.get(event, self.state)
+        return added_peers
+
     def check_file_exists(self):
         for file_info in self.metainfo["files"]:
+            if file_info.get("pad"):
+                continue
             path = os.path.normpath(os.path.join(self.base_path, file_info["path"]))
             if not os.path.exists(path):
                 logging.info(f"File missing: {path}")
@@ -308,15 +348,16 @@ class Client:
                                   if pid in active_peer_ids and (time.time() - stats.last_update) < 10}
             time.sleep(5)
 
-    def update_peers(self):
-        while self.state == 'downloading' and self.running:
-            self.contact_tracker()
-            time.sleep(15)  # Faster updates for new seeders
+    def start_announcer(self):
+        """Have the shared announce scheduler re-announce this torrent on the tracker's interval."""
+        announce_scheduler.register(self)
 
     def start_download(self):
         if not self.running:
             return
         self.state = 'downloading'
+        # Share finished pieces with other leechers while downloading the rest
+        self.start_upload_server()
         self.contact_tracker("started")
         
         logging.info(f"Starting download to {self.base_path} with {len(self.peers)} peers")
@@ -351,8 +392,7 @@ class Client:
         max_concurrent = 2
         active_threads = []
         
-        peer_update_thread = threading.Thread(target=self.update_peers, daemon=True)
-        peer_update_thread.start()
+        self.start_announcer()
         
         def download_worker():
             while not piece_queue.empty() and self.running and not self.paused:
@@ -372,9 +412,11 @@ class Client:
                 peers_with_piece = []
                 for peer in self.peers:
                     peer_id = peer["peer_id"]
+                    if self.ban_list.is_banned(peer_id):
+                        continue
                     mock_peer = Peer(peer_id, peer["ip"], peer["port"], self.piece_manager)
                     try:
-                        if mock_peer.connect():
+                        if mock_peer.connect(self.peer_id, self.port):
                             if peer_id in self.peer_stats:
                                 stats = self.peer_stats[peer_id]
                                 # Check if peer has this piece based on bitfield
@@ -419,17 +461,30 @@ class Client:
                         try:
                             # Peer is already connected from earlier
                             start_time = time.time()
+                            bad_blocks = peer.bad_blocks
+                            hash_failures = peer.hash_failures
                             success = peer.download_piece(piece_index, self.peer_id)
                             elapsed_time = time.time() - start_time
                             
                             with self.db_lock:
                                 piece_size = self.piece_manager.expected_piece_length(piece_index)
                                 stats.update_download(success, elapsed_time, piece_size)
+                                stats.bad_blocks += peer.bad_blocks - bad_blocks
+                            corrupt = self.attribute_piece(piece_index, stats, success,
+                                                           senders=peer.piece_senders,
+                                                           resumed_bad_blocks=peer.resumed_bad_blocks,
+                                                           bad_blocks=peer.piece_bad_blocks,
+                                                           bad_hashes=peer.bad_block_hashes,
+                                                           hash_failed=peer.hash_failures > hash_failures)
                             
                             if success:
                                 with self.speed_lock:
                                     self.temp_bytes_downloaded += piece_size
                                 logging.info(f"Successfully downloaded piece {piece_index} from {stats.peer_id} in {elapsed_time:.2f}s")
+                            elif corrupt:
+                                # Retrying the same peer would most likely fetch the same bad data
+                                logging.warning(f"Not retrying piece {piece_index} from {stats.peer_id} after bad data")
+                                break
                             else:
                                 logging.warning(f"Failed to download piece {piece_index} from {stats.peer_id}")
                                 retries += 1
@@ -463,6 +518,42 @@ class Client:
             # Start seeding immediately
             threading.Thread(target=self.listen_for_requests, daemon=True).start()
 
+    def attribute_piece(self, piece_index, stats, success, senders, resumed_bad_blocks, bad_blocks, bad_hashes,
+                        hash_failed):
+        """Score the peers behind a download attempt, returning True if this peer sent bad data.
+
+        Blocks failing Merkle checks are blamed on the sender alone, by their share of the
+        piece, and block hashes not matching the piece's root count as a whole bad piece.
+        A piece failing its hash check is shared out among the peers whose blocks went into
+        it, by their share of its blocks, since resumed pieces can mix data from several
+        peers and sessions.
+        senders maps block indices to the (peer_id, ip, port) that sent them; blocks whose
+        sender is unknown charge nobody. resumed_bad_blocks maps blocks read back from disk
+        that failed Merkle checks to their senders in the same way, each charged by its share.
+        """
+        block_count = self.piece_manager.block_count(piece_index)
+        if bad_blocks or bad_hashes:
+            # Scored per piece like hash failures, so one bad piece never bans a peer on its own
+            self.ban_list.record_failure(stats.peer_id, stats.ip, stats.port,
+                                         weight=bad_blocks / block_count + bad_hashes)
+        bad_sent = {}
+        for sender in resumed_bad_blocks.values():
+            if sender is not None:
+                bad_sent[sender] = bad_sent.get(sender, 0) + 1
+        for (peer_id, ip, port), blocks in bad_sent.items():
+            self.ban_list.record_failure(peer_id, ip, port, weight=blocks / block_count)
+        blocks_sent = {}
+        for sender in senders.values():
+            blocks_sent[sender] = blocks_sent.get(sender, 0) + 1
+        if hash_failed:
+            for (peer_id, ip, port), blocks in blocks_sent.items():
+                self.ban_list.record_failure(peer_id, ip, port, weight=blocks / block_count)
+        elif success:
+            # A peer caught with bad blocks in this piece earns no trust back from it
+            for peer_id in {peer_id for peer_id, _, _ in blocks_sent} - {peer_id for peer_id, _, _ in bad_sent}:
+                self.ban_list.record_success(peer_id)
+        return bool(bad_blocks) or bad_hashes or hash_failed
+
     def handle_upload(self, conn, addr):
         try:
             port = addr[1]
@@ -479,6 +570,9 @@ class Client:
                 current_time = time.time()
                 self.upload_slots = {pid: last_time for pid, last_time in self.upload_slots.items() 
                                     if current_time - last_time < 60}  # Remove slots inactive for 60s
+                # Downloaders reconnect for every piece, so runs are kept across connections until they go quiet
+                self.last_upload_piece = {ip: (index, served_at) for ip, (index, served_at) in self.last_upload_piece.items()
+                                          if current_time - served_at < 60}
                 
                 # Rotate slots if needed
                 if current_time - self.last_slot_rotation > self.slot_rotation_interval:
@@ -511,9 +605,18 @@ class Client:
             if allowed_to_upload:
                 conn.settimeout(15)
                 data = conn.recv(1024).decode().strip()
-                if data != "ESTABLISH":
+                if data != "ESTABLISH" and not data.startswith("ESTABLISH:"):
                     logging.debug(f"Invalid initial message from {addr}: {data}")
                     return
+                # ESTABLISH:<peer_id>[:<listen port>] from peers that identify themselves
+                fields = data.split(":")
+                remote_peer_id = fields[1] if len(fields) > 1 else None
+                # Peers learned from compact tracker responses are known, and banned, by listening address
+                listen_address = f"{addr[0]}:{fields[2]}" if len(fields) > 2 else None
+                banned = [name for name in (remote_peer_id, listen_address) if name and self.ban_list.is_banned(name)]
+                if banned:
+                    logging.info(f"Refusing banned peer {banned[0]} at {addr}")
+                    return
                 conn.send("ESTABLISHED".encode())
                 
                 # Handle bitfield exchange
@@ -541,12 +644,29 @@ class Client:
                         if not data:
                             logging.debug(f"Empty request from {addr}, closing")
                             break
+                        if data.startswith("HASHES:"):
+                            # Block hashes for a Merkle torrent, the peer checks them against the piece root
+                            try:
+                                piece_index = int(data.split(":")[1])
+                            except (IndexError, ValueError):
+                                logging.debug(f"Malformed hashes request from {addr}: {data}")
+                                continue
+                            leaves = self.piece_manager.get_block_hashes(piece_index)
+                            if leaves is None:
+                                # The peer waits for a fixed number of bytes, closing is the only clear answer
+                                logging.warning(f"No block hashes for piece {piece_index}, closing connection to {addr}")
+                                break
+                            conn.sendall(leaves)
+                            continue
                         if not data.startswith("REQUEST:"):
                             logging.debug(f"Invalid request from {addr}: {data}")
                             continue
                         
                         try:
-                            piece_index = int(data.split(":")[1])
+                            # REQUEST:<index> for a whole piece, REQUEST:<index>:<begin>:<length> to resume one
+                            parts = data.split(":")
+                            piece_index = int(parts[1])
+                            block_range = (int(parts[2]), int(parts[3])) if len(parts) == 4 else None
                         except (IndexError, ValueError):
                             logging.debug(f"Malformed request from {addr}: {data}")
                             continue
@@ -558,39 +678,65 @@ class Client:
                         logging.info(f"New upload connection from {addr}")
                         logging.info(f"Seeder received request: {data}")
                         
-                        read_start = time.time()
-                        piece_data = self.piece_manager._read_piece(piece_index)
-                        read_time = time.time() - read_start
-                        logging.info(f"Read piece {piece_index} in {read_time:.2f}s")
+                        if not 0 <= piece_index < self.piece_manager.total_pieces or not self.piece_manager.have_pieces[piece_index]:
+                            # The peer waits for piece bytes that will never come, closing tells it to move on
+                            logging.info(f"Piece {piece_index} not available for {addr}, closing connection")
+                            break
                         
-                        if piece_data:
-                            logging.info(f"Sending piece {piece_index} from {self.base_path}")
-                            total_sent = 0
-                            chunk_size = 4096
-                            for i in range(0, len(piece_data), chunk_size):
-                                if not self.running or self.paused:
-                                    break
-                                chunk = piece_data[i:i+chunk_size]
-                                try:
-                                    bytes_sent = conn.send(chunk)
-                                    total_sent += bytes_sent
-                                except socket.error:
-                                    logging.warning(f"Failed to send chunk to {addr}")
+                        # Cache hits are served from shared memory, misses read into a pooled buffer
+                        buffer = None
+                        if piece_index not in self.piece_manager.cache:
+                            buffer = buffer_pool.acquire(self.piece_manager.expected_piece_length(piece_index))
+                        try:
+                            read_start = time.time()
+                            piece_data = self.piece_manager.read_piece(piece_index, out=buffer)
+                            read_time = time.time() - read_start
+                            logging.info(f"Read piece {piece_index} in {read_time:.2f}s")
+                        
+                            # Peer is walking through pieces in order, read ahead so the next requests hit the cache
+                            if self.last_upload_piece.get(addr[0], (None, 0))[0] == piece_index - 1:
+                                self.piece_manager.prefetch(range(piece_index + 1, piece_index + 1 + READ_AHEAD_PIECES))
+                            self.last_upload_piece[addr[0]] = (piece_index, time.time())
+                        
+                            if piece_data and block_range:
+                                begin, length = block_range
+                                if begin < 0 or length <= 0 or begin + length > len(piece_data):
+                                    # Like an unavailable piece, the peer would wait for bytes that never come
+                                    logging.info(f"Invalid range {begin}+{length} for piece {piece_index} from {addr}, closing connection")
                                     break
+                                piece_data = memoryview(piece_data)[begin:begin + length]
+                        
+                            if piece_data:
+                                logging.info(f"Sending piece {piece_index} from {self.base_path}")
+                                total_sent = 0
+                                chunk_size = 4096
+                                for i in range(0, len(piece_data), chunk_size):
+                                    if not self.running or self.paused:
+                                        break
+                                    chunk = piece_data[i:i+chunk_size]
+                                    try:
+                                        bytes_sent = conn.send(chunk)
+                                        total_sent += bytes_sent
+                                    except socket.error:
+                                        logging.warning(f"Failed to send chunk to {addr}")
+                                        break
                             
-                            if total_sent == len(piece_data):
-                                with self.speed_lock:
-                                    self.temp_bytes_uploaded += total_sent
-                                    logging.info(f"Added {total_sent} bytes to upload counter, now {self.temp_bytes_uploaded}")
+                                if total_sent == len(piece_data):
+                                    with self.speed_lock:
+                                        self.temp_bytes_uploaded += total_sent
+                                        logging.info(f"Added {total_sent} bytes to upload counter, now {self.temp_bytes_uploaded}")
                                 
-                                if peer_id not in self.peer_stats:
-                                    self.peer_stats[peer_id] = PeerStats(peer_id, addr[0], addr[1])
-                                self.peer_stats[peer_id].update_upload(total_sent)
-                                logging.info(f"Successfully sent piece {piece_index} to {addr}: {total_sent} bytes")
+                                    if peer_id not in self.peer_stats:
+                                        self.peer_stats[peer_id] = PeerStats(peer_id, addr[0], addr[1])
+                                    self.peer_stats[peer_id].update_upload(total_sent)
+                                    logging.info(f"Successfully sent piece {piece_index} to {addr}: {total_sent} bytes")
+                                else:
+                                    logging.warning(f"Failed to send complete piece {piece_index}: sent {total_sent}/{len(piece_data)}")
                             else:
-                                logging.warning(f"Failed to send complete piece {piece_index}: sent {total_sent}/{len(piece_data)}")
-                        else:
-                            logging.warning(f"Piece {piece_index} not available")
+                                logging.warning(f"Piece {piece_index} not available")
+                        finally:
+                            if buffer is not None:
+                                buffer_pool.release(buffer)
                     except socket.timeout:
                         logging.debug(f"Timeout waiting for request from {addr}")
                         break
@@ -606,25 +752,21 @@ class Client:
                     del self.upload_slots[peer_id]
             conn.close()
 
-    def listen_for_requests(self):
-        if not self.check_file_exists():
-            logging.info(f"Cannot seed: files missing at {self.base_path}")
-            self.state = 'idle'
+    def start_upload_server(self):
+        """Accept upload connections in the background, also while still downloading.
+
+        Peers are only served pieces in have_pieces, so a partial download adds upload
+        capacity to the swarm as soon as it has anything to share.
+        """
+        if self.upload_thread and self.upload_thread.is_alive():
             return
-        self.state = 'seeding'
-        self.contact_tracker("started")
-        logging.info(f"Client seeding from {self.base_path}, listening on port {self.port}")
-        
-        def update_peers():
-            while self.state == 'seeding' and self.running:
-                self.contact_tracker()
-                time.sleep(15)
-        
-        peer_update_thread = threading.Thread(target=self.update_peers, daemon=True)
-        peer_update_thread.start()
-        
+        self.upload_thread = threading.Thread(target=self._serve_uploads, name="UploadServer", daemon=True)
+        self.upload_thread.start()
+
+    def _serve_uploads(self):
+        logging.info(f"Serving uploads from {self.base_path}, listening on port {self.port}")
         try:
-            while self.running:
+            while self.running and self.upload_server:
                 self.upload_server.settimeout(1.0)
                 try:
                     conn, addr = self.upload_server.accept()
@@ -632,12 +774,28 @@ class Client:
                 except socket.timeout:
                     continue
         except Exception as e:
-            logging.error(f"Listen error: {e}")
+            if self.running:
+                logging.error(f"Listen error: {e}")
         finally:
             if self.upload_server:
                 self.upload_server.close()
                 self.upload_server = None
-            self.contact_tracker("stopped")
+
+    def listen_for_requests(self):
+        if not self.check_file_exists():
+            logging.info(f"Cannot seed: files missing at {self.base_path}")
+            self.state = 'idle'
+            return
+        self.state = 'seeding'
+        # After a download the tracker already has us from its "started" and "completed" announces
+        if not self.announced:
+            self.contact_tracker("started")
+        logging.info(f"Client seeding from {self.base_path}, listening on port {self.port}")
+        self.start_announcer()
+        
+        # The server may already be running since the download started
+        self.start_upload_server()
+        self.upload_thread.join()
 
     def pause(self):
         self.paused = True
@@ -654,10 +812,14 @@ class Client:
         self.running = False
         self.paused = False
         self.state = 'stopped'
-        self.contact_tracker("stopped")
+        # The only place "stopped" is sent, so the tracker hears it once
+        if self.announced:
+            self.contact_tracker("stopped")
+        announce_scheduler.unregister(self)
         if self.upload_server:
             self.upload_server.close()
             self.upload_server = None
+        self.piece_manager.close()
         for peer in self.active_connections[:]:
             try:
                 peer.close()
@@ -1,5 +1,32 @@
 # File: config.py
-PIECE_SIZE = 512 * 1024  # 512 KB
+import os
+
 TRACKER_PORT = 8000
 PEER_PORT = 6881
-DOWNLOAD_DIR = "downloads"
\ No newline at end of file
+DOWNLOAD_DIR = "downloads"
+PIECE_CACHE_SIZE = 64 * 1024 * 1024  # 64 MB of hot pieces kept in memory for uploads
+READ_AHEAD_PIECES = 4  # Pieces prefetched when a peer requests a sequential run
+PREALLOCATE_MODE = "sparse"  # "full" reserves disk blocks up front, "sparse" only sets file sizes, "none" disables
+DISK_IO_WORKERS = 4  # Threads doing piece reads, hashing and writes
+DISK_IO_QUEUE_SIZE = 64  # Pending disk jobs before submitters block
+BLOCK_SIZE = 16 * 1024  # Unit in which partially downloaded pieces are tracked and resumed
+MAX_BUFFER_MEMORY = 128 * 1024 * 1024  # Cap on piece buffers held by downloads and uploads across all torrents
+TORRENT_HASH_BATCH_SIZE = 32 * 1024 * 1024  # Bytes of pieces each torrent creation worker hashes per task
+HASH_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".liketorrent", "hash_cache.json")  # Reused piece hashes for torrent creation
+MIN_PIECE_SIZE = 256 * 1024  # Smallest piece size picked for new torrents, each piece costs a request round trip
+MAX_PIECE_SIZE = 16 * 1024 * 1024  # Largest piece size picked for new torrents
+TARGET_PIECE_COUNT = 1500  # Piece count new torrents aim for when choosing a piece size
+METAINFO_CACHE_SIZE = 32  # Parsed torrents kept for reopening, least recently used dropped first
+MAX_PIECES_FIELD_SIZE = 200 * 1024  # Upper bound on the piece hashes in a new torrent's metainfo, 10k pieces
+BAN_SCORE = 3.0  # Hash failure score at which a peer is banned, a sole sender of a bad piece scores 1
+BAN_DURATION = 600  # Seconds of the first ban, doubled for every repeat
+PERMANENT_BAN_AFTER = 3  # Bans after which a peer is never used again
+TRACKER_NUMWANT = 8  # Peers asked of the tracker per announce, it samples them at random from larger swarms
+DEFAULT_ANNOUNCE_INTERVAL = 15  # Seconds between announces when the tracker does not send an interval
+ANNOUNCE_JITTER = 0.1  # Announces come up to this fraction early, so peers that started together drift apart
+ANNOUNCE_BATCH_DELAY = 0.05  # Seconds an announce waits for announces of other torrents to the same tracker
+ANNOUNCE_BATCH_WINDOW = 5  # Seconds before it is due that a re-announce may join another torrent's batch
+ANNOUNCE_BATCH_MAX = 200  # Torrents per batch announce request, below the tracker's MAX_BATCH_ANNOUNCES
+ANNOUNCE_WORKERS = 4  # Threads sending announce batches, one batch in flight per tracker
+ANNOUNCE_TIMEOUT = 30  # Seconds to wait for a tracker's reply
+ANNOUNCE_RETRY_DELAY = 10  # Seconds before a failed re-announce is tried again
@@ -0,0 +1,93 @@
+# File: disk_io.py
+import itertools
+import queue
+import threading
+import logging
+from concurrent.futures import Future
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Job types double as priorities: lower values are picked up first
+READ = 0      # Upload reads, a peer is waiting on the socket
+HASH = 1      # Piece verification
+WRITE = 2     # Bulk writes of downloaded pieces
+PREFETCH = 3  # Speculative read-ahead into the piece cache
+JOB_NAMES = {READ: "reads", HASH: "hashes", WRITE: "writes", PREFETCH: "prefetches"}
+_SHUTDOWN = 99
+
+class DiskIO:
+    """Worker pool that runs disk jobs off the network threads, with a bounded job queue."""
+
+    def __init__(self, num_workers, max_queue):
+        self.jobs = queue.PriorityQueue(maxsize=max_queue)
+        self.sequence = itertools.count()  # Keeps FIFO order within a priority
+        self.lock = threading.Lock()
+        self.queued = {job_type: 0 for job_type in JOB_NAMES}
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = True
+        self.workers = []
+        for i in range(num_workers):
+            t = threading.Thread(target=self._worker, name=f"DiskIO-{i}", daemon=True)
+            t.start()
+            self.workers.append(t)
+
+    def submit(self, job_type, func, *args, callback=None):
+        """Queue func(*args) and return a Future, blocking while the queue is full."""
+        if not self.running:
+            raise RuntimeError("Disk I/O pool is shut down")
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        with self.lock:
+            self.queued[job_type] += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, sum(self.queued.values()))
+        self.jobs.put((job_type, next(self.sequence), future, func, args))
+        return future
+
+    def _worker(self):
+        while True:
+            job_type, _, future, func, args = self.jobs.get()
+            if job_type == _SHUTDOWN:
+                break
+            with self.lock:
+                self.queued[job_type] -= 1
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args))
+                with self.lock:
+                    self.completed += 1
+            except Exception as e:
+                logging.error(f"Disk {JOB_NAMES[job_type]} job failed: {e}")
+                future.set_exception(e)
+                with self.lock:
+                    self.failed += 1
+
+    def queue_depth(self):
+        with self.lock:
+            return sum(self.queued.values())
+
+    def stats(self):
+        with self.lock:
+            stats = {f"queued_{name}": self.queued[job_type] for job_type, name in JOB_NAMES.items()}
+            stats.update({
+                "queue_depth": sum(self.queued.values()),
+                "peak_queue_depth": self.peak_queue_depth,
+                "completed": self.completed,
+                "failed": self.failed,
+                "workers": len(self.workers)
+            })
+            return stats
+
+    def shutdown(self, wait=False):
+        if not self.running:
+            return
+        self.running = False
+        # Sentinels sort after every real job, so queued work still finishes
+        for _ in self.workers:
+            self.jobs.put((_SHUTDOWN, next(self.sequence), None, None, None))
+        if wait:
+            for t in self.workers:
+                t.join(timeout=5.0)
@@ -0,0 +1,66 @@
+# File: hash_cache.py
+import os
+import json
+import logging
+from src.peer.hashing import DEFAULT_HASH_ALGORITHM
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class HashCache:
+    """On-disk cache of piece hashes for files used in earlier torrents.
+
+    Only pieces lying entirely inside one file are cached. They are keyed by the
+    file's path, size and mtime plus the piece length, hash algorithm and where the
+    file starts relative to a piece boundary, so an unchanged file is never reread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.hits = 0
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.files = json.load(f).get("files", {})
+            except Exception as e:
+                logging.warning(f"Ignoring unreadable hash cache {path}: {e}")
+
+    def _key(self, file_path):
+        return os.path.abspath(file_path)
+
+    def lookup(self, file_path, stat, piece_length, alignment, hash_algorithm=DEFAULT_HASH_ALGORITHM):
+        """Return cached (digests, Merkle roots) of the file's whole pieces, (b"", b"") if the file changed.
+
+        Roots are b"" when the file was last hashed without them.
+        """
+        record = self.files.get(self._key(file_path))
+        if (not record or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns or
+                record["piece_length"] != piece_length or record["alignment"] != alignment or
+                record.get("hash_algorithm", DEFAULT_HASH_ALGORITHM) != hash_algorithm):
+            return b"", b""
+        self.hits += 1
+        return bytes.fromhex(record["hashes"]), bytes.fromhex(record.get("roots", ""))
+
+    def store(self, file_path, stat, piece_length, alignment, digests, roots=b"", hash_algorithm=DEFAULT_HASH_ALGORITHM):
+        # stat is taken before hashing, so a file modified meanwhile will not match next time
+        self.files[self._key(file_path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "piece_length": piece_length,
+            "alignment": alignment,
+            "hash_algorithm": hash_algorithm,
+            "hashes": bytes(digests).hex(),
+            "roots": bytes(roots).hex()
+        }
+
+    def save(self):
+        # Forget files that no longer exist so the cache does not grow forever
+        self.files = {path: record for path, record in self.files.items() if os.path.exists(path)}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"files": self.files}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.warning(f"Failed to save hash cache {self.path}: {e}")
@@ -0,0 +1,22 @@
+# File: hashing.py
+import hashlib
+import functools
+
+DEFAULT_HASH_ALGORITHM = "sha1"  # Plain BitTorrent v1, torrents without a hash_algorithm field use it
+
+# Piece hash algorithms a torrent may name in its info "hash_algorithm" field
+HASH_ALGORITHMS = {
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": functools.partial(hashlib.blake2b, digest_size=32),
+}
+
+def new_hash(algorithm, data=b""):
+    """A hashlib object for a piece hash algorithm."""
+    try:
+        return HASH_ALGORITHMS[algorithm](data)
+    except KeyError:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+
+def digest_size(algorithm):
+    return new_hash(algorithm).digest_size
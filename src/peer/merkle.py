@@ -0,0 +1,23 @@
+# File: merkle.py
+import hashlib
+
+MERKLE_HASH_SIZE = 32  # SHA-256 digests, as in BitTorrent v2
+
+def block_hashes(piece_data, block_size):
+    """Concatenated SHA-256 leaf hashes of each block of a piece, the last block may be short."""
+    view = memoryview(piece_data)
+    return b"".join(hashlib.sha256(view[begin:begin + block_size]).digest()
+                    for begin in range(0, len(view), block_size))
+
+def merkle_root(leaves):
+    """Root of the binary tree over concatenated leaf hashes, padded with zero hashes to a power of two."""
+    layer = [leaves[i:i + MERKLE_HASH_SIZE] for i in range(0, len(leaves), MERKLE_HASH_SIZE)]
+    if not layer:
+        return bytes(MERKLE_HASH_SIZE)
+    width = 1
+    while width < len(layer):
+        width *= 2
+    layer.extend([bytes(MERKLE_HASH_SIZE)] * (width - len(layer)))
+    while len(layer) > 1:
+        layer = [hashlib.sha256(layer[i] + layer[i + 1]).digest() for i in range(0, len(layer), 2)]
+    return bytes(layer[0])
@@ -1,61 +1,223 @@
 # File: metainfo.py
-import bencodepy
 import hashlib
 import logging
 import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from src.peer.config import METAINFO_CACHE_SIZE
+from src.peer.merkle import MERKLE_HASH_SIZE
+from src.peer.hashing import DEFAULT_HASH_ALGORITHM, digest_size
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+_cache = OrderedDict()  # absolute path -> (mtime_ns, size, Metainfo), least recently used first
+_cache_lock = threading.Lock()
+
+def _skip(data, pos):
+    """Return the offset just past the bencoded value starting at pos, without decoding it."""
+    depth = 0
+    try:
+        while True:
+            token = data[pos]
+            if token == 0x64 or token == 0x6c:  # d, l
+                depth += 1
+                pos += 1
+            elif token == 0x65 and depth:  # e
+                depth -= 1
+                pos += 1
+            elif token == 0x69:  # i
+                pos = data.index(b"e", pos) + 1
+            elif 0x30 <= token <= 0x39:
+                colon = data.index(b":", pos)
+                pos = colon + 1 + int(data[pos:colon])
+            else:
+                raise ValueError(f"Invalid torrent: bad bencode at offset {pos}")
+            if depth == 0:
+                if pos > len(data):
+                    raise ValueError("Invalid torrent: truncated bencode")
+                return pos
+    except IndexError:
+        raise ValueError("Invalid torrent: truncated bencode")
+
+def _decode(data, pos):
+    """Decode the bencoded value at pos, returning (value, end offset)."""
+    token = data[pos]
+    if token == 0x69:  # i
+        end = data.index(b"e", pos)
+        return int(data[pos + 1:end]), end + 1
+    if 0x30 <= token <= 0x39:
+        colon = data.index(b":", pos)
+        end = colon + 1 + int(data[pos:colon])
+        return data[colon + 1:end], end
+    if token == 0x6c:  # l
+        pos += 1
+        items = []
+        while data[pos] != 0x65:
+            value, pos = _decode(data, pos)
+            items.append(value)
+        return items, pos + 1
+    if token == 0x64:  # d
+        pos += 1
+        items = {}
+        while data[pos] != 0x65:
+            key, pos = _decode(data, pos)
+            items[key], pos = _decode(data, pos)
+        return items, pos + 1
+    raise ValueError(f"Invalid torrent: bad bencode at offset {pos}")
+
+def _dict_spans(data, start, nested=None):
+    """Map each key of the bencoded dict at start to the (start, end) span of its raw value.
+
+    Returns (spans, end). If nested is a key whose value is itself a dict, that dict's
+    spans are collected into spans[(nested,)] in the same pass instead of skipping over it.
+    """
+    if data[start:start + 1] != b"d":
+        raise ValueError("Invalid torrent: not a dictionary")
+    spans = {}
+    pos = start + 1
+    while data[pos:pos + 1] != b"e":
+        if pos >= len(data):
+            raise ValueError("Invalid torrent: truncated bencode")
+        if not data[pos:pos + 1].isdigit():
+            raise ValueError(f"Invalid torrent: bad dictionary key at offset {pos}")
+        key_end = _skip(data, pos)
+        key = data[data.index(b":", pos) + 1:key_end]
+        if key == nested and data[key_end:key_end + 1] == b"d":
+            spans[(key,)], pos = _dict_spans(data, key_end)
+        else:
+            pos = _skip(data, key_end)
+        spans[key] = (key_end, pos)
+    return spans, pos + 1
+
+class Metainfo(Mapping):
+    """Parsed torrent that decodes its file list and piece hashes only when first used.
+
+    The info hash is taken over the raw info bytes as they appear in the file.
+    """
+
+    def __init__(self, data, info_spans, values):
+        self._data = data
+        self._info_spans = info_spans
+        self._values = values
+        self._lock = threading.Lock()
+        self._loaders = {"files": self._load_files, "pieces": self._load_pieces, "piece_roots": self._load_piece_roots}
+
+    def _decode(self, key):
+        return _decode(self._data, self._info_spans[key][0])[0]
+
+    def _raw_string(self, key):
+        if key not in self._info_spans:
+            return b""
+        start, end = self._info_spans[key]
+        return self._data[self._data.index(b":", start) + 1:end]
+
+    def _load_pieces(self):
+        # Concatenated piece digests (20-byte SHA-1 unless hash_algorithm says otherwise), kept raw
+        return self._raw_string(b"pieces")
+
+    def _load_piece_roots(self):
+        # Optional per-piece Merkle roots of block hashes, b"" for plain torrents
+        return self._raw_string(b"piece_roots")
+
+    def _load_files(self):
+        if b"files" in self._info_spans:
+            return [
+                {
+                    "length": f[b"length"],
+                    "path": os.path.join(*[p.decode("utf-8") for p in f[b"path"]]),
+                    # BEP 47 pad file: zero bytes that only align the next file to a piece boundary
+                    "pad": b"p" in f.get(b"attr", b"")
+                }
+                for f in self._decode(b"files")
+            ]
+        return [{"length": self._decode(b"length"), "path": self._values["name"], "pad": False}]
+
+    def __getitem__(self, key):
+        if key in self._values:
+            return self._values[key]
+        if key not in self._loaders:
+            raise KeyError(key)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = self._loaders[key]()
+            return self._values[key]
+
+    def __iter__(self):
+        yield from self._values
+        yield from (key for key in self._loaders if key not in self._values)
+
+    def __len__(self):
+        return len(set(self._values) | set(self._loaders))
+
 def parse_torrent(torrent_file):
+    """Load a torrent, reusing the parsed result while the file's mtime and size are unchanged."""
     try:
+        stat = os.stat(torrent_file)
+        cache_key = os.path.abspath(torrent_file)
+        with _cache_lock:
+            cached = _cache.get(cache_key)
+            if cached:
+                _cache.move_to_end(cache_key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            logging.info(f"Using cached metainfo for {torrent_file}")
+            return cached[2]
+
         with open(torrent_file, "rb") as f:
             data = f.read()
             logging.info(f"Parsing torrent file: {torrent_file}, size: {len(data)} bytes")
-            metainfo = bencodepy.decode(data)
-        
-        if not isinstance(metainfo, dict):
-            raise ValueError("Invalid torrent: not a dictionary")
-        
-        if b"info" not in metainfo:
+
+        spans, _ = _dict_spans(data, 0, nested=b"info")
+        if b"info" not in spans:
             raise ValueError("Invalid torrent: missing 'info'")
-        
-        info = metainfo[b"info"]
-        if not isinstance(info, dict):
+        if (b"info",) not in spans:
             raise ValueError("Invalid torrent: 'info' not a dictionary")
-        
-        piece_length = info.get(b"piece_length")
+        info_start, info_end = spans[b"info"]
+        info_spans = spans[(b"info",)]
+
+        piece_length = _decode(data, info_spans[b"piece_length"][0])[0] if b"piece_length" in info_spans else None
         if not isinstance(piece_length, int):
             logging.error(f"Invalid piece_length: {piece_length}")
             raise ValueError("Invalid torrent: 'piece_length' must be an integer")
-        
-        pieces = info.get(b"pieces", b"")
-        if not isinstance(pieces, bytes):
-            raise ValueError("Invalid torrent: 'pieces' must be bytes")
-        
-        piece_hashes = [pieces[i:i+20].hex() for i in range(0, len(pieces), 20)]
-        
-        result = {
-            "announce": metainfo.get(b"announce", b"").decode("utf-8"),
+
+        announce = _decode(data, spans[b"announce"][0])[0] if b"announce" in spans else b""
+        name = _decode(data, info_spans[b"name"][0])[0] if b"name" in info_spans else b""
+        if not isinstance(announce, bytes) or not isinstance(name, bytes):
+            raise ValueError("Invalid torrent: 'announce' and 'name' must be strings")
+        if b"files" not in info_spans and b"length" not in info_spans:
+            raise ValueError("Invalid torrent: missing 'files' or 'length'")
+        hash_algorithm = _decode(data, info_spans[b"hash_algorithm"][0])[0] if b"hash_algorithm" in info_spans else b""
+        if not isinstance(hash_algorithm, bytes):
+            raise ValueError("Invalid torrent: 'hash_algorithm' must be a string")
+        hash_algorithm = hash_algorithm.decode("utf-8") or DEFAULT_HASH_ALGORITHM
+        for key, hash_size in ((b"pieces", digest_size(hash_algorithm)), (b"piece_roots", MERKLE_HASH_SIZE)):
+            if key not in info_spans:
+                continue
+            # Checked from the string header, the hashes themselves are only sliced out when used
+            start, end = info_spans[key]
+            if not data[start:start + 1].isdigit():
+                raise ValueError(f"Invalid torrent: '{key.decode()}' must be bytes")
+            if (end - data.index(b":", start) - 1) % hash_size:
+                raise ValueError(f"Invalid torrent: '{key.decode()}' length is not a multiple of {hash_size}")
+
+        result = Metainfo(data, info_spans, {
+            "announce": announce.decode("utf-8"),
             "piece_length": piece_length,
-            "pieces": piece_hashes,
-            "torrent_hash": hashlib.sha1(bencodepy.encode(info)).hexdigest()
-        }
-        
-        if b"files" in info:
-            result["files"] = [
-                {
-                    "length": f[b"length"],
-                    "path": os.path.join(*[p.decode("utf-8") for p in f[b"path"]])
-                }
-                for f in info[b"files"]
-            ]
-        else:
-            result["files"] = [{"length": info[b"length"], "path": info[b"name"].decode("utf-8")}]
-        
-        logging.info(f"Parsed torrent: hash={result['torrent_hash']}, files={[f['path'] for f in result['files']]}")
+            "name": name.decode("utf-8"),
+            "hash_algorithm": hash_algorithm,
+            "torrent_hash": hashlib.sha1(data[info_start:info_end]).hexdigest()
+        })
+
+        with _cache_lock:
+            _cache[cache_key] = (stat.st_mtime_ns, stat.st_size, result)
+            _cache.move_to_end(cache_key)
+            # Each entry holds the whole torrent file, so only the recently opened ones are kept
+            while len(_cache) > METAINFO_CACHE_SIZE:
+                _cache.popitem(last=False)
+        logging.info(f"Parsed torrent: hash={result['torrent_hash']}, name={result['name']}")
         return result
-    
+
     except Exception as e:
         logging.error(f"Failed to parse torrent: {e}")
-        raise
\ No newline at end of file
+        raise
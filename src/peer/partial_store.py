@@ -0,0 +1,128 @@
+# File: partial_store.py
+import os
+import json
+import time
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class PartialPieceStore:
+    """Block bitmaps of unfinished pieces whose blocks were already written in place.
+
+    Saved as JSON next to the download so the next session only requests the missing blocks.
+    The peer that sent each block is saved with it, so a piece failing its hash check after
+    a restart is still blamed on the peers behind its blocks.
+    """
+
+    def __init__(self, path, piece_length, block_size, save_interval=1.0):
+        self.path = path
+        self.piece_length = piece_length
+        self.block_size = block_size
+        self.save_interval = save_interval
+        self.pieces = {}  # piece index -> set of block indices on disk
+        self.senders = {}  # piece index -> {block index: (peer_id, ip, port) of the peer that sent it}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # Serializes writers so an older snapshot never replaces a newer one
+        self.dirty = False
+        self.last_save = 0.0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            if state.get("piece_length") != self.piece_length or state.get("block_size") != self.block_size:
+                logging.info(f"Ignoring partial pieces in {self.path}: piece layout changed")
+                return
+            for piece_index, bitmap_hex in state.get("pieces", {}).items():
+                bitmap = bytes.fromhex(bitmap_hex)
+                blocks = {i for i in range(len(bitmap) * 8) if bitmap[i // 8] & (1 << (7 - (i % 8)))}
+                if blocks:
+                    self.pieces[int(piece_index)] = blocks
+            for piece_index, senders in state.get("senders", {}).items():
+                blocks = self.pieces.get(int(piece_index), ())
+                senders = {int(block_index): tuple(sender) for block_index, sender in senders.items()
+                           if int(block_index) in blocks}
+                if senders:
+                    self.senders[int(piece_index)] = senders
+            logging.info(f"Loaded {len(self.pieces)} partial pieces from {self.path}")
+        except Exception as e:
+            logging.warning(f"Failed to load partial pieces from {self.path}: {e}")
+
+    def received_blocks(self, piece_index):
+        with self.lock:
+            return set(self.pieces.get(piece_index, ()))
+
+    def block_senders(self, piece_index):
+        """{block index: (peer_id, ip, port)} for the blocks of a piece whose sender is known."""
+        with self.lock:
+            return dict(self.senders.get(piece_index, {}))
+
+    def has_all_blocks(self, piece_index, block_count):
+        with self.lock:
+            return len(self.pieces.get(piece_index, ())) >= block_count
+
+    def mark_block(self, piece_index, block_index, sender=None):
+        with self.lock:
+            self.pieces.setdefault(piece_index, set()).add(block_index)
+            if sender is not None:
+                self.senders.setdefault(piece_index, {})[block_index] = tuple(sender)
+            else:
+                self.senders.get(piece_index, {}).pop(block_index, None)
+            self.dirty = True
+        self.save()
+
+    def clear(self, piece_index):
+        with self.lock:
+            if self.pieces.pop(piece_index, None) is not None:
+                self.dirty = True
+            self.senders.pop(piece_index, None)
+        self.save()
+
+    def clear_blocks(self, piece_index, block_indices):
+        with self.lock:
+            blocks = self.pieces.get(piece_index)
+            if blocks is None:
+                return
+            blocks.difference_update(block_indices)
+            senders = self.senders.get(piece_index, {})
+            for block_index in block_indices:
+                senders.pop(block_index, None)
+            if not blocks:
+                del self.pieces[piece_index]
+                self.senders.pop(piece_index, None)
+            self.dirty = True
+        self.save()
+
+    def save(self, force=False):
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty or (not force and time.time() - self.last_save < self.save_interval):
+                    return
+                pieces = {}
+                for piece_index, blocks in self.pieces.items():
+                    bitmap = bytearray(max(blocks) // 8 + 1)
+                    for i in blocks:
+                        bitmap[i // 8] |= 1 << (7 - (i % 8))
+                    pieces[str(piece_index)] = bitmap.hex()
+                senders = {str(piece_index): {str(block_index): list(sender) for block_index, sender in blocks.items()}
+                           for piece_index, blocks in self.senders.items() if blocks}
+                state = {"piece_length": self.piece_length, "block_size": self.block_size, "pieces": pieces,
+                         "senders": senders}
+                self.dirty = False
+                self.last_save = time.time()
+            try:
+                if not pieces:
+                    if os.path.exists(self.path):
+                        os.remove(self.path)
+                    return
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logging.warning(f"Failed to save partial pieces to {self.path}: {e}")
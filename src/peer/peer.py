@@ -1,8 +1,10 @@
 # File: peer.py
 import socket
 import time
-import hashlib
 import logging
+from src.peer.config import BLOCK_SIZE
+from src.peer.buffer_pool import buffer_pool
+from src.peer.merkle import MERKLE_HASH_SIZE
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -13,14 +15,24 @@ class Peer:
         self.port = port
         self.piece_manager = piece_manager
         self.sock = None
+        self.bad_blocks = 0  # Blocks from this peer that failed Merkle verification
+        self.hash_failures = 0  # Pieces this peer sent data for that failed the piece hash check
+        self.piece_senders = {}  # Block index -> (peer_id, ip, port) behind the last piece that was checked
+        self.resumed_bad_blocks = {}  # Block index -> sender or None of resumed blocks of the last piece that failed Merkle checks
+        self.piece_bad_blocks = 0  # Blocks this peer sent for the last piece that failed Merkle checks
+        self.bad_block_hashes = False  # Whether this peer sent block hashes not matching the last piece's root
 
-    def connect(self):
+    def connect(self, my_peer_id=None, my_port=None):
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.settimeout(15)
             logging.info(f"Attempting to connect to peer {self.peer_id} at {self.ip}:{self.port}")
             self.sock.connect((self.ip, self.port))
-            self.sock.send("ESTABLISH".encode())
+            # Our peer id and listening port let the other side apply its ban list
+            handshake = "ESTABLISH"
+            if my_peer_id:
+                handshake += f":{my_peer_id}" + (f":{my_port}" if my_port else "")
+            self.sock.send(handshake.encode())
             response = self.sock.recv(1024).decode().strip()
             if response == "ESTABLISHED":
                 logging.info(f"Successfully connected to {self.peer_id}")
@@ -36,35 +48,123 @@ class Peer:
             return False
 
     def download_piece(self, piece_index, my_peer_id):
+        block_writes = []
+        self.piece_senders = {}
+        self.resumed_bad_blocks = {}
+        self.piece_bad_blocks = 0
+        self.bad_block_hashes = False
+        expected_size = self.piece_manager.expected_piece_length(piece_index)
+        # Waits here when the global buffer budget is used up, before anything is requested
+        piece_data = buffer_pool.acquire(expected_size)
         try:
-            request = f"REQUEST:{piece_index}"
-            logging.info(f"Sending request: {request} to {self.peer_id}")
-            self.sock.send(request.encode())
+            ranges = self.piece_manager.missing_ranges(piece_index)
+            resumed = False
+            if ranges != [(0, expected_size)]:
+                # Blocks from an earlier attempt are already on disk, only fetch the rest
+                if self.piece_manager.read_partial_piece(piece_index, piece_data) is None:
+                    self.piece_manager.clear_partial(piece_index)
+                    ranges = [(0, expected_size)]
+                else:
+                    resumed = True
+                    logging.info(f"Resuming piece {piece_index}: {sum(length for _, length in ranges)}/{expected_size} bytes missing")
             
-            expected_size = self.piece_manager.expected_piece_length(piece_index)
-            data = b""
-            while len(data) < expected_size:
-                chunk = self.sock.recv(4096)
-                if not chunk:
-                    logging.error(f"Connection closed by {self.peer_id} while downloading piece {piece_index}")
+            if self.piece_manager.merkle and not self.piece_manager.has_block_hashes(piece_index):
+                if not self.fetch_block_hashes(piece_index):
                     return False
-                data += chunk
-                logging.debug(f"Received {len(chunk)} bytes, total: {len(data)}/{expected_size}")
             
-            if len(data) != expected_size:
-                logging.error(f"Piece {piece_index} size mismatch: expected {expected_size}, got {len(data)}")
-                return False
+            if resumed and self.piece_manager.merkle:
+                # A bad block on disk is fetched again instead of failing the piece and blaming this peer
+                self.resumed_bad_blocks = self.piece_manager.verify_resumed_blocks(piece_index, piece_data)
+                if self.resumed_bad_blocks:
+                    logging.warning(f"Resumed blocks {sorted(self.resumed_bad_blocks)} of piece {piece_index} failed Merkle "
+                                    f"verification, requesting them again")
+                    ranges = self.piece_manager.missing_ranges(piece_index)
+            
+            bad_blocks = []
+            view = memoryview(piece_data)
+            for begin, length in ranges:
+                if (begin, length) == (0, expected_size):
+                    request = f"REQUEST:{piece_index}"
+                else:
+                    request = f"REQUEST:{piece_index}:{begin}:{length}"
+                logging.info(f"Sending request: {request} to {self.peer_id}")
+                self.sock.send(request.encode())
+                
+                end = begin + length
+                received = begin
+                next_block = begin
+                while received < end:
+                    n = self.sock.recv_into(view[received:end])
+                    if not n:
+                        logging.error(f"Connection closed by {self.peer_id} while downloading piece {piece_index}")
+                        return False
+                    received += n
+                    logging.debug(f"Received {n} bytes, total: {received}/{end}")
+                    # Persist every finished block so an interrupted piece can be resumed later
+                    while next_block < received and (received - next_block >= BLOCK_SIZE or received == end):
+                        block_end = min(next_block + BLOCK_SIZE, end)
+                        block_index = next_block // BLOCK_SIZE
+                        if self.piece_manager.merkle and not self.piece_manager.verify_block(
+                                piece_index, block_index, view[next_block:block_end]):
+                            # Keep reading the rest of the range, only this block is dropped
+                            bad_blocks.append(block_index)
+                        else:
+                            block_writes.append(self.piece_manager.write_block_async(
+                                piece_index, block_index, bytes(view[next_block:block_end]),
+                                sender=(self.peer_id, self.ip, self.port)))
+                        next_block = block_end
             
-            logging.info(f"Downloaded piece {piece_index} with {len(data)} bytes")
-            success = self.piece_manager.piece_complete(piece_index, data)
-            if not success:
-                actual_hash = hashlib.sha1(data).hexdigest()
-                expected_hash = self.piece_manager.piece_hashes[piece_index]
-                logging.error(f"Hash mismatch for piece {piece_index}: expected {expected_hash}, got {actual_hash}")
-            return success
+            self._wait_for_writes(block_writes)
+            block_writes = []
+            if bad_blocks:
+                self.bad_blocks += len(bad_blocks)
+                self.piece_bad_blocks = len(bad_blocks)
+                logging.error(f"Blocks {bad_blocks} of piece {piece_index} from {self.peer_id} failed Merkle verification, "
+                              f"keeping the other blocks")
+                return False
+            logging.info(f"Downloaded piece {piece_index} with {expected_size} bytes")
+            # Taken before the partial store forgets the piece, so the client can score every sender
+            self.piece_senders = self.piece_manager.block_senders(piece_index)
+            if not self.piece_manager.verify_piece_async(piece_index, piece_data).result():
+                # Kept apart from write errors so only bad data is blamed on peers
+                self.hash_failures += 1
+                self.piece_manager.discard_piece(piece_index)
+                logging.error(f"Piece {piece_index} from {self.peer_id} failed verification")
+                return False
+            return self.piece_manager.store_verified_piece(piece_index, piece_data)
         except Exception as e:
             logging.error(f"Download error for piece {piece_index}: {e}")
             return False
+        finally:
+            self._wait_for_writes(block_writes)
+            buffer_pool.release(piece_data)
+
+    def fetch_block_hashes(self, piece_index):
+        """Ask the peer for a piece's block hashes and check them against the torrent's Merkle root."""
+        expected_size = self.piece_manager.block_count(piece_index) * MERKLE_HASH_SIZE
+        self.sock.send(f"HASHES:{piece_index}".encode())
+        leaves = bytearray(expected_size)
+        view = memoryview(leaves)
+        received = 0
+        while received < expected_size:
+            n = self.sock.recv_into(view[received:])
+            if not n:
+                logging.error(f"Connection closed by {self.peer_id} while sending hashes for piece {piece_index}")
+                return False
+            received += n
+        if not self.piece_manager.set_block_hashes(piece_index, leaves):
+            logging.error(f"Block hashes for piece {piece_index} from {self.peer_id} are invalid")
+            self.bad_blocks += 1
+            self.bad_block_hashes = True
+            return False
+        return True
+
+    def _wait_for_writes(self, futures):
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Block write failed: {e}")
 
     def close(self):
         if self.sock:
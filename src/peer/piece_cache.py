@@ -0,0 +1,67 @@
+# File: piece_cache.py
+import threading
+import logging
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class PieceCache:
+    """LRU cache of verified piece data, bounded by a total byte budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.pieces = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, piece_index):
+        with self.lock:
+            data = self.pieces.get(piece_index)
+            if data is None:
+                self.misses += 1
+                return None
+            self.pieces.move_to_end(piece_index)
+            self.hits += 1
+            return data
+
+    def put(self, piece_index, piece_data):
+        if self.max_bytes <= 0 or len(piece_data) > self.max_bytes:
+            return
+        data = bytes(piece_data)
+        with self.lock:
+            old = self.pieces.pop(piece_index, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self.pieces[piece_index] = data
+            self.current_bytes += len(data)
+            # Evict least recently used pieces until we fit the budget again
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.pieces.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, piece_index):
+        with self.lock:
+            old = self.pieces.pop(piece_index, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+
+    def __contains__(self, piece_index):
+        with self.lock:
+            return piece_index in self.pieces
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "pieces": len(self.pieces),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -1,20 +1,52 @@
 # File: piece_manager.py
 import os
 import math
+import bisect
+import shutil
 import hashlib
 import logging
+from concurrent.futures import Future
+from src.peer.config import PIECE_CACHE_SIZE, PREALLOCATE_MODE, DISK_IO_WORKERS, DISK_IO_QUEUE_SIZE, BLOCK_SIZE
+from src.peer.piece_cache import PieceCache
+from src.peer.disk_io import DiskIO, READ, HASH, WRITE, PREFETCH
+from src.peer.partial_store import PartialPieceStore
+from src.peer.buffer_pool import buffer_pool
+from src.peer.merkle import MERKLE_HASH_SIZE, block_hashes, merkle_root
+from src.peer.hashing import DEFAULT_HASH_ALGORITHM, new_hash, digest_size
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class PieceManager:
-    def __init__(self, metainfo, peer_id, base_path):
+    def __init__(self, metainfo, peer_id, base_path, preallocate_mode=PREALLOCATE_MODE):
         self.metainfo = metainfo
         self.peer_id = peer_id
         self.base_path = base_path
-        self.total_pieces = math.ceil(sum(f["length"] for f in metainfo["files"]) / metainfo["piece_length"])
+        self.preallocate_mode = preallocate_mode
+        self.total_length = sum(f["length"] for f in metainfo["files"])
+        self.total_pieces = math.ceil(self.total_length / metainfo["piece_length"])
         self.have_pieces = [False] * self.total_pieces
         self.files = self._map_files()
+        self.hash_algorithm = metainfo.get("hash_algorithm") or DEFAULT_HASH_ALGORITHM
+        self.hash_size = digest_size(self.hash_algorithm)
+        # Piece i's digest is piece_hashes[i * hash_size:(i + 1) * hash_size], sliced without copying
+        self.piece_hashes = memoryview(metainfo["pieces"])
+        if len(self.piece_hashes) != self.total_pieces * self.hash_size:
+            raise ValueError(f"Invalid torrent: {len(self.piece_hashes) // self.hash_size} piece hashes "
+                             f"for {self.total_pieces} pieces")
+        # Optional Merkle roots of each piece's blocks, enables checking blocks as they arrive
+        self.piece_roots = memoryview(metainfo.get("piece_roots") or b"")
+        self.merkle = len(self.piece_roots) > 0
+        if self.merkle and len(self.piece_roots) != self.total_pieces * MERKLE_HASH_SIZE:
+            raise ValueError(f"Invalid torrent: {len(self.piece_roots) // MERKLE_HASH_SIZE} piece roots for {self.total_pieces} pieces")
+        self.block_leaves = {}  # piece index -> verified block hashes of a piece being downloaded
+        self.file_offsets = [f["offset"] for f in self.files]
+        self.cache = PieceCache(PIECE_CACHE_SIZE)
+        self.disk_io = DiskIO(DISK_IO_WORKERS, DISK_IO_QUEUE_SIZE)
+        self.partial = PartialPieceStore(os.path.join(base_path, f".{metainfo['torrent_hash']}.parts"),
+                                         metainfo["piece_length"], BLOCK_SIZE)
         self._check_existing_files()
+        if not self.all_pieces_downloaded():
+            self._preallocate_files()
         logging.info(f"Initialized PieceManager: {self.total_pieces} pieces, base_path={base_path}")
 
     def _map_files(self):
@@ -25,45 +57,111 @@ class PieceManager:
             files.append({
                 "path": file_path,
                 "length": file_info["length"],
-                "offset": offset
+                "offset": offset,
+                "pad": file_info.get("pad", False)
             })
             offset += file_info["length"]
         return files
 
     def _check_existing_files(self):
-        all_complete = True
-        for piece_index in range(self.total_pieces):
-            piece_data = self._read_piece(piece_index)
-            if piece_data is None:
-                all_complete = False
-                continue
-            expected_hash = self.metainfo["pieces"][piece_index]
-            piece_hash = hashlib.sha1(piece_data).hexdigest()
-            self.have_pieces[piece_index] = (piece_hash == expected_hash)
-            if not self.have_pieces[piece_index]:
-                all_complete = False
-                logging.info(f"Piece {piece_index} hash mismatch: expected {expected_hash}, got {piece_hash}")
+        # Read and hash pieces on the disk workers so several pieces are checked at once
+        futures = [self.disk_io.submit(HASH, self._check_existing_piece, piece_index)
+                   for piece_index in range(self.total_pieces)]
+        for piece_index, future in enumerate(futures):
+            self.have_pieces[piece_index] = future.result()
+            if self.have_pieces[piece_index]:
+                self.partial.clear(piece_index)
+        all_complete = all(self.have_pieces)
         if all_complete:
             logging.info("All pieces verified, ready to seed")
         else:
             logging.info(f"Missing or invalid pieces: {self.have_pieces.count(False)}")
 
-    def _read_piece(self, piece_index):
+    def _check_existing_piece(self, piece_index):
+        buffer = buffer_pool.acquire(self.expected_piece_length(piece_index))
+        try:
+            piece_data = self._read_piece(piece_index, out=buffer)
+            if piece_data is None:
+                return False
+            expected_hash = self.expected_hash(piece_index)
+            piece_hash = new_hash(self.hash_algorithm, piece_data).digest()
+            if piece_hash != expected_hash:
+                logging.info(f"Piece {piece_index} hash mismatch: expected {expected_hash.hex()}, got {piece_hash.hex()}")
+                return False
+            return True
+        finally:
+            buffer_pool.release(buffer)
+
+    def _preallocate_files(self):
+        """Create every target file at its final size before any piece is written."""
+        if self.preallocate_mode not in ("full", "sparse"):
+            return
+        missing_bytes = 0
+        for file_info in self.files:
+            if file_info["pad"]:
+                continue
+            current_size = os.path.getsize(file_info["path"]) if os.path.exists(file_info["path"]) else 0
+            missing_bytes += max(0, file_info["length"] - current_size)
+        if missing_bytes == 0:
+            return
+        self._check_free_space(missing_bytes)
+
+        for file_info in self.files:
+            if file_info["pad"]:
+                continue
+            path = file_info["path"]
+            exists = os.path.exists(path)
+            if exists and os.path.getsize(path) >= file_info["length"]:
+                continue
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "r+b" if exists else "wb") as f:
+                if self.preallocate_mode == "full" and hasattr(os, "posix_fallocate") and file_info["length"] > 0:
+                    os.posix_fallocate(f.fileno(), 0, file_info["length"])
+                else:
+                    # Sparse mode, or no posix_fallocate on this platform (Windows extends files non-sparse anyway)
+                    f.truncate(file_info["length"])
+        logging.info(f"Preallocated {missing_bytes} bytes ({self.preallocate_mode}) under {self.base_path}")
+
+    def _check_free_space(self, required_bytes):
+        # Walk up to the nearest directory that exists, the target folders may not be created yet
+        directory = os.path.abspath(self.base_path)
+        while not os.path.isdir(directory):
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        free_bytes = shutil.disk_usage(directory).free
+        if free_bytes < required_bytes:
+            raise RuntimeError(f"Not enough disk space in {directory}: torrent needs {required_bytes / 1024 / 1024:.1f} MB, "
+                               f"only {free_bytes / 1024 / 1024:.1f} MB free")
+
+    def _files_in_range(self, offset, length):
+        """The files overlapping bytes [offset, offset + length) of the torrent, in order."""
+        index = max(0, bisect.bisect_right(self.file_offsets, offset) - 1)
+        while index < len(self.files) and self.files[index]["offset"] < offset + length:
+            file_info = self.files[index]
+            if file_info["offset"] + file_info["length"] > offset:
+                yield file_info
+            index += 1
+
+    def _read_piece(self, piece_index, out=None):
         piece_offset = piece_index * self.metainfo["piece_length"]
         piece_length = self.expected_piece_length(piece_index)
-        piece_data = bytearray(piece_length)
+        piece_data = out if out is not None else bytearray(piece_length)
         bytes_read = 0
 
-        for file_info in self.files:
-            file_start = file_info["offset"]
-            file_end = file_start + file_info["length"]
-            if piece_offset + piece_length <= file_start or piece_offset >= file_end:
-                continue
-            start_in_file = max(0, piece_offset - file_start)
+        for file_info in self._files_in_range(piece_offset, piece_length):
+            start_in_file = max(0, piece_offset - file_info["offset"])
             bytes_to_read = min(
                 file_info["length"] - start_in_file,
                 piece_length - bytes_read
             )
+            if file_info["pad"]:
+                # Pad files are all zeros and never stored, pooled buffers may hold older data
+                piece_data[bytes_read:bytes_read + bytes_to_read] = bytes(bytes_to_read)
+                bytes_read += bytes_to_read
+                continue
             try:
                 with open(file_info["path"], "rb") as f:
                     f.seek(start_in_file)
@@ -75,51 +173,257 @@ class PieceManager:
                 return None
         return piece_data if bytes_read == piece_length else None
 
-    def write_piece(self, piece_index, piece_data):
-        piece_offset = piece_index * self.metainfo["piece_length"]
-        bytes_written = 0
-        for file_info in self.files:
-            file_start = file_info["offset"]
-            file_end = file_start + file_info["length"]
-            if piece_offset + len(piece_data) <= file_start or piece_offset >= file_end:
+    def read_piece(self, piece_index, out=None):
+        """Return a piece for uploading, served from the read cache when possible.
+
+        On a cache miss the piece is read into out when given, e.g. a buffer from the buffer pool.
+        """
+        return self.read_piece_async(piece_index, out=out).result()
+
+    def read_piece_async(self, piece_index, callback=None, out=None):
+        """Queue an upload read ahead of bulk disk work; the Future resolves to the data or None."""
+        piece_data = None
+        if 0 <= piece_index < self.total_pieces:
+            # Only verified pieces are ever cached, looking up others would just count as misses
+            if self.have_pieces[piece_index]:
+                piece_data = self.cache.get(piece_index)
+            if piece_data is None:
+                return self.disk_io.submit(READ, self._read_and_cache, piece_index, out, callback=callback)
+        future = Future()
+        future.set_result(piece_data)
+        if callback:
+            future.add_done_callback(callback)
+        return future
+
+    def _read_and_cache(self, piece_index, out=None):
+        piece_data = self._read_piece(piece_index, out=out)
+        if piece_data is not None and self.have_pieces[piece_index]:
+            self.cache.put(piece_index, piece_data)
+        return piece_data
+
+    def prefetch(self, piece_indices):
+        """Warm the read cache with pieces a peer is likely to request next."""
+        # Read-ahead is only worth it while the disk is keeping up with real requests
+        if self.disk_io.queue_depth() >= DISK_IO_QUEUE_SIZE // 2:
+            return
+        for piece_index in piece_indices:
+            if not 0 <= piece_index < self.total_pieces or not self.have_pieces[piece_index]:
+                continue
+            if piece_index in self.cache:
                 continue
-            start_in_file = max(0, piece_offset - file_start)
+            self.disk_io.submit(PREFETCH, self._prefetch_piece, piece_index)
+
+    def _prefetch_piece(self, piece_index):
+        if piece_index in self.cache:
+            return
+        # Waiting for buffer memory here would hold up the reads of uploads that own it, so skip instead
+        buffer = buffer_pool.try_acquire(self.expected_piece_length(piece_index))
+        if buffer is None:
+            return
+        # The cache keeps its own copy, so the pooled buffer goes straight back
+        try:
+            self._read_and_cache(piece_index, out=buffer)
+        finally:
+            buffer_pool.release(buffer)
+
+    def _write_range(self, offset, data):
+        """Write data at a torrent-wide byte offset, spanning files as needed."""
+        bytes_written = 0
+        for file_info in self._files_in_range(offset, len(data)):
+            start_in_file = max(0, offset - file_info["offset"])
             bytes_to_write = min(
                 file_info["length"] - start_in_file,
-                len(piece_data) - bytes_written
+                len(data) - bytes_written
             )
+            if file_info["pad"]:
+                bytes_written += bytes_to_write
+                continue
             os.makedirs(os.path.dirname(file_info["path"]), exist_ok=True)
             try:
                 with open(file_info["path"], "r+b" if os.path.exists(file_info["path"]) else "wb") as f:
                     f.seek(start_in_file)
-                    f.write(piece_data[bytes_written:bytes_written + bytes_to_write])
+                    f.write(data[bytes_written:bytes_written + bytes_to_write])
                     bytes_written += bytes_to_write
             except Exception as e:
                 logging.error(f"Failed to write {file_info['path']}: {e}")
                 return False
-        if bytes_written == len(piece_data):
-            self.have_pieces[piece_index] = True
+        return bytes_written == len(data)
+
+    def write_piece(self, piece_index, piece_data):
+        self.cache.invalidate(piece_index)
+        if self._write_range(piece_index * self.metainfo["piece_length"], piece_data):
+            self._mark_complete(piece_index)
             logging.info(f"Wrote piece {piece_index}")
             return True
         return False
 
-    def piece_complete(self, piece_index, piece_data):
-        expected_hash = self.metainfo["pieces"][piece_index]
-        piece_hash = hashlib.sha1(piece_data).hexdigest()
+    def _mark_complete(self, piece_index):
+        self.have_pieces[piece_index] = True
+        self.partial.clear(piece_index)
+        self.block_leaves.pop(piece_index, None)
+
+    def block_count(self, piece_index):
+        return math.ceil(self.expected_piece_length(piece_index) / BLOCK_SIZE)
+
+    def missing_ranges(self, piece_index):
+        """Contiguous (begin, length) byte ranges of a piece that are not on disk yet."""
+        piece_length = self.expected_piece_length(piece_index)
+        received = self.partial.received_blocks(piece_index)
+        ranges = []
+        for block_index in range(self.block_count(piece_index)):
+            if block_index in received:
+                continue
+            begin = block_index * BLOCK_SIZE
+            length = min(BLOCK_SIZE, piece_length - begin)
+            if ranges and ranges[-1][0] + ranges[-1][1] == begin:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+            else:
+                ranges.append((begin, length))
+        return ranges
+
+    def read_partial_piece(self, piece_index, out):
+        """Read an unfinished piece into out through the disk queue, so the blocks already on disk can be reused.
+
+        Returns None if the read failed.
+        """
+        piece_data = self.read_piece_async(piece_index, out=out).result()
+        if piece_data is not None and piece_data is not out:
+            out[:len(piece_data)] = piece_data
+        return piece_data
+
+    def clear_partial(self, piece_index, block_indices=None):
+        """Forget blocks of an unfinished piece on disk, all of them by default, so they are requested again."""
+        if block_indices is None:
+            self.partial.clear(piece_index)
+        else:
+            self.partial.clear_blocks(piece_index, block_indices)
+
+    def write_block(self, piece_index, block_index, block_data, sender=None):
+        """Write one block of an unfinished piece in place and remember it, and the (peer_id, ip, port) that sent it, for resuming."""
+        offset = piece_index * self.metainfo["piece_length"] + block_index * BLOCK_SIZE
+        if not self._write_range(offset, block_data):
+            return False
+        self.partial.mark_block(piece_index, block_index, sender)
+        return True
+
+    def write_block_async(self, piece_index, block_index, block_data, sender=None, callback=None):
+        return self.disk_io.submit(WRITE, self.write_block, piece_index, block_index, block_data, sender,
+                                   callback=callback)
+
+    def block_senders(self, piece_index):
+        """{block index: (peer_id, ip, port)} of the blocks of an unfinished piece, including earlier sessions'."""
+        return self.partial.block_senders(piece_index)
+
+    def write_piece_async(self, piece_index, piece_data, callback=None):
+        return self.disk_io.submit(WRITE, self.write_piece, piece_index, piece_data, callback=callback)
+
+    def expected_hash(self, piece_index):
+        return self.piece_hashes[piece_index * self.hash_size:(piece_index + 1) * self.hash_size]
+
+    def verify_piece(self, piece_index, piece_data):
+        expected_hash = self.expected_hash(piece_index)
+        piece_hash = new_hash(self.hash_algorithm, piece_data).digest()
         if piece_hash != expected_hash:
-            logging.warning(f"Piece {piece_index} hash mismatch: expected {expected_hash}, got {piece_hash}")
+            logging.warning(f"Piece {piece_index} hash mismatch: expected {expected_hash.hex()}, got {piece_hash.hex()}")
+            return False
+        return True
+
+    def set_block_hashes(self, piece_index, leaves):
+        """Accept a peer's block hashes for a piece if they fold up to the root in the torrent."""
+        leaves = bytes(leaves)
+        if (len(leaves) != self.block_count(piece_index) * MERKLE_HASH_SIZE or
+                merkle_root(leaves) != self.piece_roots[piece_index * MERKLE_HASH_SIZE:(piece_index + 1) * MERKLE_HASH_SIZE]):
+            logging.warning(f"Block hashes for piece {piece_index} do not match its Merkle root")
             return False
-        return self.write_piece(piece_index, piece_data)
+        self.block_leaves[piece_index] = leaves
+        return True
+
+    def has_block_hashes(self, piece_index):
+        return piece_index in self.block_leaves
+
+    def verify_block(self, piece_index, block_index, block_data):
+        """Check one block against the piece's verified block hashes."""
+        leaves = self.block_leaves.get(piece_index)
+        if leaves is None:
+            return False
+        expected = leaves[block_index * MERKLE_HASH_SIZE:(block_index + 1) * MERKLE_HASH_SIZE]
+        return hashlib.sha256(block_data).digest() == expected
+
+    def verify_resumed_blocks(self, piece_index, piece_data):
+        """Check the blocks of an unfinished piece read back from disk against its block hashes.
+
+        Blocks that fail are forgotten so they are requested again; returns {block index: (peer_id, ip, port)
+        that sent it, or None if unknown} for them.
+        """
+        bad_blocks = []
+        view = memoryview(piece_data)
+        for block_index in sorted(self.partial.received_blocks(piece_index)):
+            begin = block_index * BLOCK_SIZE
+            if not self.verify_block(piece_index, block_index, view[begin:begin + BLOCK_SIZE]):
+                bad_blocks.append(block_index)
+        if not bad_blocks:
+            return {}
+        # Looked up before the partial store forgets them
+        senders = self.partial.block_senders(piece_index)
+        self.clear_partial(piece_index, bad_blocks)
+        return {block_index: senders.get(block_index) for block_index in bad_blocks}
+
+    def get_block_hashes(self, piece_index):
+        """Block hashes of a piece we have, sent to peers that verify blocks as they arrive."""
+        if not self.merkle or not 0 <= piece_index < self.total_pieces or not self.have_pieces[piece_index]:
+            return None
+        # Like uploads, cache hits are hashed in place and misses read into a pooled buffer
+        buffer = None
+        if piece_index not in self.cache:
+            buffer = buffer_pool.acquire(self.expected_piece_length(piece_index))
+        try:
+            piece_data = self.read_piece(piece_index, out=buffer)
+            if piece_data is None:
+                return None
+            return block_hashes(piece_data, BLOCK_SIZE)
+        finally:
+            if buffer is not None:
+                buffer_pool.release(buffer)
+
+    def verify_piece_async(self, piece_index, piece_data, callback=None):
+        return self.disk_io.submit(HASH, self.verify_piece, piece_index, piece_data, callback=callback)
+
+    def piece_complete(self, piece_index, piece_data):
+        if not self.verify_piece_async(piece_index, piece_data).result():
+            self.discard_piece(piece_index)
+            return False
+        return self.store_verified_piece(piece_index, piece_data)
+
+    def discard_piece(self, piece_index):
+        # Any stored block may be the bad one, fetch the whole piece again
+        self.partial.clear(piece_index)
+        self.block_leaves.pop(piece_index, None)
+
+    def store_verified_piece(self, piece_index, piece_data):
+        """Finish a piece that passed verify_piece, writing whatever is not on disk yet."""
+        if self.partial.has_all_blocks(piece_index, self.block_count(piece_index)):
+            # Every block was already written in place while downloading
+            self.cache.invalidate(piece_index)
+            self._mark_complete(piece_index)
+            logging.info(f"Completed piece {piece_index} from blocks on disk")
+            return True
+        return self.write_piece_async(piece_index, piece_data).result()
 
     def expected_piece_length(self, piece_index):
-        total_length = sum(f["length"] for f in self.metainfo["files"])
         regular_piece_length = self.metainfo["piece_length"]
         if piece_index == self.total_pieces - 1:
-            return total_length - (piece_index * regular_piece_length)
+            return self.total_length - (piece_index * regular_piece_length)
         return regular_piece_length
 
     def all_pieces_downloaded(self):
         return all(self.have_pieces)
 
     def missing_pieces(self):
-        return [i for i, have in enumerate(self.have_pieces) if not have]
\ No newline at end of file
+        return [i for i, have in enumerate(self.have_pieces) if not have]
+
+    def get_stats(self):
+        return {"cache": self.cache.stats(), "disk_io": self.disk_io.stats(), "buffers": buffer_pool.stats()}
+
+    def close(self):
+        self.disk_io.shutdown(wait=True)
+        self.partial.save(force=True)
@@ -1,64 +1,263 @@
 # File: torrent_maker.py
 import os
+import time
 import hashlib
 import bencodepy
 import math
+import bisect
 import logging
-from src.peer.config import PIECE_SIZE
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.peer.config import (MIN_PIECE_SIZE, MAX_PIECE_SIZE, TARGET_PIECE_COUNT, MAX_PIECES_FIELD_SIZE, BLOCK_SIZE,
+                             TORRENT_HASH_BATCH_SIZE)
+from src.peer.hash_cache import HashCache
+from src.peer.merkle import MERKLE_HASH_SIZE, block_hashes, merkle_root
+from src.peer.hashing import DEFAULT_HASH_ALGORITHM, new_hash, digest_size
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def create_torrent_file(files, tracker_url, output_path):
+def choose_piece_size(total_length, target_pieces=TARGET_PIECE_COUNT, min_size=MIN_PIECE_SIZE, max_size=MAX_PIECE_SIZE,
+                      max_pieces_field=MAX_PIECES_FIELD_SIZE, hash_size=20):
+    """Pick a power-of-two piece size for total_length bytes of content.
+
+    Aims for about target_pieces pieces, then grows the size until the hash_size-byte
+    piece hashes fit in max_pieces_field bytes, all within [min_size, max_size].
+    """
+    piece_size = min_size
+    while piece_size < max_size and total_length / piece_size > target_pieces:
+        piece_size *= 2
+    while piece_size < max_size and math.ceil(total_length / piece_size) * hash_size > max_pieces_field:
+        piece_size *= 2
+    return min(piece_size, max_size)
+
+def _segments(file_entries, file_starts, start, end):
+    """The (path, offset_in_file, length) reads covering bytes [start, end) of the concatenated files."""
+    segments = []
+    file_index = max(0, bisect.bisect_right(file_starts, start) - 1)
+    position = start
+    while position < end:
+        path, length = file_entries[file_index]
+        file_end = file_starts[file_index] + length
+        if position >= file_end:
+            file_index += 1
+            continue
+        read_length = min(file_end, end) - position
+        segments.append((path, position - file_starts[file_index], read_length))
+        position += read_length
+    return segments
+
+def _plan_batches(file_entries, piece_length, piece_indices):
+    """Group the pieces to hash into runs of consecutive pieces, at most one batch in size each.
+
+    Each batch is (first_piece, piece_count, segments) where segments are the
+    reads that make up those pieces, in order.
+    """
+    file_starts = []
+    total_length = 0
+    for _, length in file_entries:
+        file_starts.append(total_length)
+        total_length += length
+    pieces_per_batch = max(1, TORRENT_HASH_BATCH_SIZE // piece_length)
+    runs = []
+    for piece_index in piece_indices:
+        if runs and runs[-1][0] + runs[-1][1] == piece_index and runs[-1][1] < pieces_per_batch:
+            runs[-1][1] += 1
+        else:
+            runs.append([piece_index, 1])
+    batches = []
+    for first_piece, piece_count in runs:
+        start = first_piece * piece_length
+        end = min(start + piece_count * piece_length, total_length)
+        batches.append((first_piece, piece_count, _segments(file_entries, file_starts, start, end)))
+    return batches
+
+def _whole_pieces(file_start, file_length, piece_length, total_length):
+    """Range of pieces lying entirely inside a file that starts at file_start."""
+    first = math.ceil(file_start / piece_length)
+    file_end = file_start + file_length
+    last = file_end // piece_length
+    # The short final piece of the torrent also fits if this file holds its start
+    if file_end == total_length and total_length % piece_length and last * piece_length >= file_start:
+        last += 1
+    return range(first, max(first, last))
+
+def _hash_batch(segments, piece_length, merkle=False, hash_algorithm=DEFAULT_HASH_ALGORITHM):
+    """Hash the pieces covered by segments.
+
+    Returns their concatenated hash_algorithm digests and, with merkle, their concatenated
+    Merkle roots over BLOCK_SIZE blocks (b"" otherwise).
+    """
+    digests = bytearray()
+    roots = bytearray()
+    piece_data = bytearray(piece_length)
+    view = memoryview(piece_data)
+    filled = 0
+
+    def finish_piece(data):
+        digests.extend(new_hash(hash_algorithm, data).digest())
+        if merkle:
+            roots.extend(merkle_root(block_hashes(data, BLOCK_SIZE)))
+
+    for path, offset, length in segments:
+        if path is None:
+            # Pad file, its bytes are zeros and never stored on disk
+            remaining = length
+            while remaining:
+                n = min(remaining, piece_length - filled)
+                view[filled:filled + n] = bytes(n)
+                filled += n
+                remaining -= n
+                if filled == piece_length:
+                    finish_piece(piece_data)
+                    filled = 0
+            continue
+        with open(path, "rb") as f:
+            f.seek(offset)
+            remaining = length
+            while remaining:
+                n = f.readinto(view[filled:filled + min(remaining, piece_length - filled)])
+                if not n:
+                    raise IOError(f"{path} is shorter than expected")
+                filled += n
+                remaining -= n
+                if filled == piece_length:
+                    finish_piece(piece_data)
+                    filled = 0
+    if filled:
+        finish_piece(view[:filled])
+    return bytes(digests), bytes(roots)
+
+def create_torrent_file(files, tracker_url, output_path, workers=None, progress_callback=None, hash_cache=None,
+                        pad_files=False, piece_size=None, merkle=False, hash_algorithm=DEFAULT_HASH_ALGORITHM):
+    """Create a .torrent for files, hashing pieces in parallel worker processes.
+
+    progress_callback, if given, is called as progress_callback(bytes_hashed, total_bytes, bytes_per_second)
+    after every batch of pieces. hash_cache is the path of an on-disk HashCache; pieces made only
+    of files unchanged since an earlier run reuse their stored hashes instead of being reread.
+    With pad_files, BEP 47 pad entries are inserted so every file of a multi-file torrent starts
+    on a piece boundary. piece_size overrides the size choose_piece_size() picks from the content size.
+    With merkle, the info dict also gets "piece_roots": a SHA-256 Merkle root per piece over its
+    BLOCK_SIZE blocks, so downloaders can check every block as it arrives. hash_algorithm names
+    the piece hash (see hashing.HASH_ALGORITHMS); anything but SHA-1 is recorded in the info dict.
+    """
+    hash_size = digest_size(hash_algorithm)
+    stats = [os.stat(file_path) for file_path in files]
+    if piece_size is None:
+        piece_size = choose_piece_size(sum(stat.st_size for stat in stats), hash_size=hash_size)
+    elif piece_size <= 0 or piece_size % BLOCK_SIZE:
+        raise ValueError(f"Piece size must be a positive multiple of {BLOCK_SIZE} bytes, got {piece_size}")
     metainfo = {
         "announce": tracker_url,
         "info": {
-            "piece_length": int(PIECE_SIZE),  # Ensure integer
+            "piece_length": int(piece_size),  # Ensure integer
             "pieces": bytearray(),  # Initialize as bytearray instead of list
             "name": os.path.basename(files[0]) if len(files) == 1 else os.path.basename(os.path.dirname(files[0]) or "torrent")
         }
     }
+    if hash_algorithm != DEFAULT_HASH_ALGORITHM:
+        metainfo["info"]["hash_algorithm"] = hash_algorithm
     total_length = 0
     file_list = []
-    
-    for file_path in files:
-        file_size = os.path.getsize(file_path)
+    file_entries = []
+    file_stats = []
+
+    piece_length = metainfo["info"]["piece_length"]
+    for index, (file_path, stat) in enumerate(zip(files, stats)):
+        file_size = stat.st_size
         total_length += file_size
+        file_entries.append((file_path, file_size))
+        file_stats.append(stat)
         file_list.append({
             "length": file_size,
             "path": [os.path.relpath(file_path, os.path.dirname(files[0])).replace("\\", "/")]
         })
-    
+        if pad_files and len(files) > 1 and index < len(files) - 1 and total_length % piece_length:
+            pad_length = piece_length - total_length % piece_length
+            total_length += pad_length
+            file_entries.append((None, pad_length))
+            file_stats.append(None)
+            file_list.append({"attr": "p", "length": pad_length, "path": [".pad", str(pad_length)]})
+
     if len(files) > 1:
         metainfo["info"]["files"] = file_list
     else:
         metainfo["info"]["length"] = total_length
-    
-    piece_data = bytearray()
-    pieces_hash_bytes = bytearray()  # Store all piece hashes as a continuous byte array
-    
-    for file_path in files:
-        with open(file_path, "rb") as f:
-            while chunk := f.read(PIECE_SIZE - len(piece_data)):
-                piece_data.extend(chunk)
-                if len(piece_data) == PIECE_SIZE:
-                    piece_hash = hashlib.sha1(piece_data).digest()
-                    pieces_hash_bytes.extend(piece_hash)  # Add hash bytes directly to the bytearray
-                    piece_data = bytearray()
-    
-    if piece_data:
-        piece_hash = hashlib.sha1(piece_data).digest()
-        pieces_hash_bytes.extend(piece_hash)  # Add final hash bytes
-    
+
+    total_pieces = math.ceil(total_length / piece_length)
+    piece_hashes = [None] * total_pieces
+    piece_roots = [None] * total_pieces
+
+    # Pieces entirely inside an unchanged file keep the hash from the last run
+    cache = HashCache(hash_cache) if hash_cache else None
+    file_pieces = []
+    file_start = 0
+    for (file_path, file_size), stat in zip(file_entries, file_stats):
+        if file_path is None:
+            file_start += file_size
+            continue
+        whole_pieces = _whole_pieces(file_start, file_size, piece_length, total_length)
+        alignment = file_start % piece_length
+        file_pieces.append((file_path, stat, alignment, whole_pieces))
+        if cache:
+            cached, cached_roots = cache.lookup(file_path, stat, piece_length, alignment, hash_algorithm)
+            if merkle and len(cached_roots) != len(cached) // hash_size * MERKLE_HASH_SIZE:
+                cached = b""  # Hashed without Merkle roots last time
+            for i, piece_index in enumerate(whole_pieces[:len(cached) // hash_size]):
+                piece_hashes[piece_index] = cached[i * hash_size:(i + 1) * hash_size]
+                if merkle:
+                    piece_roots[piece_index] = cached_roots[i * MERKLE_HASH_SIZE:(i + 1) * MERKLE_HASH_SIZE]
+        file_start += file_size
+
+    dirty_pieces = [i for i, digest in enumerate(piece_hashes) if digest is None]
+    batches = _plan_batches(file_entries, piece_length, dirty_pieces)
+    workers = workers or os.cpu_count() or 1
+    start_time = time.time()
+    hashed_bytes = 0
+    dirty_bytes = sum(length for batch in batches for _, _, length in batch[2])
+
+    def store(batch, result):
+        nonlocal hashed_bytes
+        first_piece, piece_count, segments = batch
+        digests, roots = result
+        for i in range(piece_count):
+            piece_hashes[first_piece + i] = digests[i * hash_size:(i + 1) * hash_size]
+            if merkle:
+                piece_roots[first_piece + i] = roots[i * MERKLE_HASH_SIZE:(i + 1) * MERKLE_HASH_SIZE]
+        hashed_bytes += sum(length for _, _, length in segments)
+        if progress_callback:
+            elapsed = max(time.time() - start_time, 1e-6)
+            progress_callback(hashed_bytes, dirty_bytes, hashed_bytes / elapsed)
+
+    if workers == 1 or len(batches) <= 1:
+        # Not worth starting processes for a single batch
+        for batch in batches:
+            store(batch, _hash_batch(batch[2], piece_length, merkle, hash_algorithm))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as executor:
+            futures = {executor.submit(_hash_batch, batch[2], piece_length, merkle, hash_algorithm): batch for batch in batches}
+            for future in as_completed(futures):
+                store(futures[future], future.result())
+
+    if cache:
+        for file_path, stat, alignment, whole_pieces in file_pieces:
+            cache.store(file_path, stat, piece_length, alignment, b"".join(piece_hashes[i] for i in whole_pieces),
+                        b"".join(piece_roots[i] for i in whole_pieces) if merkle else b"", hash_algorithm)
+        cache.save()
+        logging.info(f"Hash cache: reused {total_pieces - len(dirty_pieces)}/{total_pieces} pieces")
+
     # Set the pieces field to the concatenated hash bytes
-    metainfo["info"]["pieces"] = bytes(pieces_hash_bytes)
-    
-    logging.info(f"Creating torrent with metainfo: {metainfo}")
+    metainfo["info"]["pieces"] = b"".join(piece_hashes)
+    if merkle:
+        metainfo["info"]["piece_roots"] = b"".join(piece_roots)
+    elapsed = time.time() - start_time
+    logging.info(f"Hashed {len(dirty_pieces)} pieces ({hashed_bytes} bytes) in {elapsed:.2f}s "
+                 f"with {workers} workers ({hashed_bytes / max(elapsed, 1e-6) / 1024 / 1024:.1f} MB/s)")
+
     encoded_info = bencodepy.encode(metainfo["info"])
     metainfo["torrent_hash"] = hashlib.sha1(encoded_info).hexdigest()
-    
+
     with open(output_path, "wb") as f:
         f.write(bencodepy.encode(metainfo))
-    
-    logging.info(f"Torrent file created: {output_path}")
-    return output_path
\ No newline at end of file
+
+    logging.info(f"Torrent file created: {output_path} ({total_pieces} pieces of {piece_length // 1024} KB)")
+    return output_path
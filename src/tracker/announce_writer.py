@@ -0,0 +1,169 @@
+# File: announce_writer.py
+import time
+import threading
+import logging
+from src.tracker.config import GROUP_COMMIT_DELAY, GROUP_COMMIT_MAX_BATCH
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+INSERT_TORRENT_SQL = "INSERT OR IGNORE INTO torrents (torrent_hash) VALUES (?)"
+DELETE_PEER_SQL = "DELETE FROM peers WHERE peer_id = ? AND torrent_hash = ?"
+UPSERT_PEER_SQL = """
+    INSERT OR REPLACE INTO peers
+    (peer_id, torrent_hash, ip, port, event, last_seen, downloaded, uploaded, download_rate, upload_rate, seeding)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+ADD_TOTALS_SQL = """
+    UPDATE torrents SET
+    total_downloaded = total_downloaded + ?,
+    total_uploaded = total_uploaded + ?
+    WHERE torrent_hash = ?
+"""
+ADD_COMPLETED_SQL = "UPDATE torrents SET completed = completed + ? WHERE torrent_hash = ?"
+SELECT_SEEDING_SQL = "SELECT seeding FROM peers WHERE peer_id = ? AND torrent_hash = ?"
+
+class _Batch:
+    """Announce writes waiting for the same commit."""
+
+    def __init__(self):
+        self.peers = {}  # (peer_id, torrent_hash) -> peers row, or None to delete; the newest announce wins
+        self.last_seen = {}  # (peer_id, torrent_hash) -> last_seen of the announce held in peers
+        self.totals = {}  # torrent_hash -> [downloaded, uploaded] to add
+        self.completed = {}  # torrent_hash -> completed events, counted even when a later announce replaces one
+        self.torrents = set()
+        self.count = 0
+        self.done = threading.Event()
+        self.error = None
+
+class AnnounceWriter:
+    """Group commit for the SQLite announce path.
+
+    Request threads add their writes to the pending batch and wait; one writer thread
+    commits the whole batch in a single transaction, so many announces share one fsync.
+    A batch is committed once the writer is free and the batch is GROUP_COMMIT_DELAY old,
+    or at once when it reaches GROUP_COMMIT_MAX_BATCH announces.
+    """
+
+    def __init__(self, db, counters, cache, delay=GROUP_COMMIT_DELAY, max_batch=GROUP_COMMIT_MAX_BATCH):
+        self.db = db
+        self.counters = counters  # ScrapeCounters, updated with each commit
+        self.cache = cache  # ResponseCache, told after each commit which swarms changed membership
+        self.delay = delay
+        self.max_batch = max_batch
+        self.pending = _Batch()
+        self.condition = threading.Condition()
+        self.running = True
+        self.commits = 0
+        self.writes = 0
+        self.thread = threading.Thread(target=self._run, name="AnnounceWriter", daemon=True)
+        self.thread.start()
+
+    def write(self, torrent_hash, peer, event):
+        """Queue one announce and block until it is committed."""
+        self.write_many([(torrent_hash, peer, event)])
+
+    def write_many(self, announces):
+        """Queue (torrent_hash, peer, event) announces into the same batch and block until it is committed."""
+        if not announces:
+            return
+        with self.condition:
+            if not self.running:
+                raise RuntimeError("Announce writer is stopped")
+            batch = self.pending
+            for torrent_hash, peer, event in announces:
+                batch.torrents.add(torrent_hash)
+                key = (peer["peer_id"], torrent_hash)
+                # An announce queued after a newer one of the same peer leaves its row, and so its expiry, alone
+                if batch.last_seen.get(key, peer["last_seen"]) <= peer["last_seen"]:
+                    batch.last_seen[key] = peer["last_seen"]
+                    if event == 'stopped':
+                        batch.peers[key] = None
+                    else:
+                        batch.peers[key] = (peer["peer_id"], torrent_hash, peer["ip"], peer["port"], event,
+                                            peer["last_seen"], peer["downloaded"], peer["uploaded"],
+                                            peer["download_rate"], peer["upload_rate"], peer["seeding"])
+                if event == 'completed' or event == 'started':
+                    totals = batch.totals.setdefault(torrent_hash, [0, 0])
+                    totals[0] += peer["downloaded"]
+                    totals[1] += peer["uploaded"]
+                if event == 'completed':
+                    batch.completed[torrent_hash] = batch.completed.get(torrent_hash, 0) + 1
+            was_empty = batch.count == 0
+            batch.count += len(announces)
+            if was_empty or batch.count >= self.max_batch:
+                self.condition.notify()
+        batch.done.wait()
+        if batch.error:
+            raise batch.error
+
+    def _next_batch(self):
+        with self.condition:
+            while not self.pending.count and self.running:
+                self.condition.wait()
+            # Give concurrent announces a moment to join a young batch
+            deadline = time.monotonic() + self.delay
+            while self.running and self.pending.count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            batch, self.pending = self.pending, _Batch()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch.count:
+                return
+            try:
+                self._commit(batch)
+            except Exception as e:
+                logging.error(f"Announce batch of {batch.count} failed: {e}")
+                batch.error = e
+                self._recount()
+            batch.done.set()
+
+    def _recount(self):
+        try:
+            with self.db.read() as conn:
+                self.counters.recount(conn)
+        except Exception as e:
+            logging.error(f"Scrape recount failed: {e}")
+
+    def _commit(self, batch):
+        deltas = {torrent_hash: [0, 0, downloaded] for torrent_hash, downloaded in batch.completed.items()}
+        with self.db.write() as conn:
+            # A peer moving between seeding and leeching, arriving or leaving changes the scrape counts
+            for (peer_id, torrent_hash), row in batch.peers.items():
+                old = conn.execute(SELECT_SEEDING_SQL, (peer_id, torrent_hash)).fetchone()
+                old_seeding = None if old is None else bool(old[0])
+                new_seeding = None if row is None else bool(row[10])
+                if old_seeding != new_seeding:
+                    delta = deltas.setdefault(torrent_hash, [0, 0, 0])
+                    delta[0] += (new_seeding is True) - (old_seeding is True)
+                    delta[1] += (new_seeding is False) - (old_seeding is False)
+            conn.executemany(INSERT_TORRENT_SQL, [(torrent_hash,) for torrent_hash in batch.torrents])
+            conn.executemany(DELETE_PEER_SQL, [key for key, row in batch.peers.items() if row is None])
+            conn.executemany(UPSERT_PEER_SQL, [row for row in batch.peers.values() if row is not None])
+            conn.executemany(ADD_TOTALS_SQL, [(downloaded, uploaded, torrent_hash)
+                                              for torrent_hash, (downloaded, uploaded) in batch.totals.items()])
+            conn.executemany(ADD_COMPLETED_SQL, [(count, torrent_hash)
+                                                 for torrent_hash, count in batch.completed.items()])
+            # Still holding the write lock, so no cleanup can interleave with these deltas
+            for torrent_hash in batch.torrents:
+                self.counters.apply(torrent_hash, *deltas.get(torrent_hash, (0, 0, 0)))
+        # Only after the commit, so no announce can cache what the tables held before it
+        self.cache.invalidate([torrent_hash for torrent_hash, delta in deltas.items() if delta[0] or delta[1]])
+        self.commits += 1
+        self.writes += batch.count
+
+    def stop(self):
+        """Commit what is pending and stop the writer thread."""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+    def stats(self):
+        return {"commits": self.commits, "writes": self.writes,
+                "writes_per_commit": self.writes / self.commits if self.commits else 0}
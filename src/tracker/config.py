@@ -0,0 +1,24 @@
+# File: config.py
+TRACKER_STORAGE = "sqlite"  # "sqlite" reads and writes the database on every announce, "memory" keeps swarms in RAM
+SNAPSHOT_INTERVAL = 30  # Seconds between SQLite snapshots of in-memory swarms, the most that a crash loses
+DB_POOL_SIZE = 8  # SQLite connections shared by request threads, more requests wait for a free one
+DB_BUSY_TIMEOUT = 5  # Seconds a write waits for the SQLite write lock before failing
+DB_CACHE_SIZE = 16 * 1024 * 1024  # Page cache of each pooled connection
+GROUP_COMMIT_DELAY = 0.002  # Seconds a new batch of announce writes waits for others to join it before committing
+GROUP_COMMIT_MAX_BATCH = 1000  # Announces after which a batch commits without waiting out the delay
+DEFAULT_NUMWANT = 50  # Peers returned when an announce does not say how many it wants
+MAX_NUMWANT = 200  # Most peers returned by one announce, larger swarms are sampled at random
+LEECHER_SEEDER_SHARE = 0.5  # Part of a leecher's peer list given to seeders when the swarm has enough of them
+FAST_PEER_OVERSAMPLE = 2  # Random candidates drawn per returned peer, the fastest reported uploaders among them win
+BASE_ANNOUNCE_INTERVAL = 30  # Seconds between announces asked of peers in small swarms on an idle tracker
+INTERVAL_SWARM_SIZE = 50  # Swarm size above which the interval grows in proportion, big swarms need fewer refreshes
+TARGET_ANNOUNCE_RATE = 200  # Announces per second above which intervals stretch to keep the tracker's load flat
+MAX_ANNOUNCE_INTERVAL = 1800  # Longest interval ever asked of a peer
+MAX_SCRAPE_HASHES = 1000  # Torrents answered by one scrape request, the rest are ignored
+MAX_BATCH_ANNOUNCES = 500  # Torrents one /announce_batch request may announce, larger batches are rejected
+PEER_TTL_INTERVALS = 2  # Announce intervals after its last announce that a peer is dropped, so one missed announce is forgiven
+PEER_TTL_GRACE = 30  # Seconds added to every peer's TTL for slow networks and clients
+EXPIRY_BATCH_SIZE = 500  # Expired peers dropped per transaction, so cleanup never holds the write lock for long
+EXPIRY_CHECK_INTERVAL = 1  # Seconds between checks for expired peers when none are left
+RESPONSE_CACHE_TTL = 0.3  # Seconds the "sqlite" mode reuses a swarm's peer sample for announces, unless membership changes first
+RESPONSE_CACHE_POOL = 500  # Seeders and leechers each in a cached sample, at least MAX_NUMWANT * FAST_PEER_OVERSAMPLE
@@ -0,0 +1,106 @@
+# File: db_pool.py
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from src.tracker.config import DB_POOL_SIZE, DB_BUSY_TIMEOUT, DB_CACHE_SIZE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Applied to every new connection. In WAL mode readers never block the writer and the
+# writer never blocks readers; synchronous=NORMAL only fsyncs at checkpoints, so a power
+# cut can lose the last few announces but the database stays consistent.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA cache_size=-{DB_CACHE_SIZE // 1024}",
+)
+
+class ConnectionPool:
+    """A fixed set of SQLite connections shared by the tracker's request threads.
+
+    Connections are kept open, so each keeps its page cache and its prepared statements
+    (sqlite3 caches them per connection by SQL text). Transactions are explicit: write()
+    takes the write lock up front with BEGIN IMMEDIATE, read() sees one consistent snapshot.
+    """
+
+    def __init__(self, db_path, size=DB_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.idle = []
+        self.created = 0
+        self.waits = 0
+        self.condition = threading.Condition()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        with self.condition:
+            while not self.idle and self.created >= self.size:
+                self.waits += 1
+                self.condition.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.created += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self.condition:
+                self.created -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, conn):
+        with self.condition:
+            self.idle.append(conn)
+            self.condition.notify()
+
+    def discard(self, conn):
+        # A connection left in an unknown state is closed instead of going back to the pool
+        conn.close()
+        with self.condition:
+            self.created -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def _transaction(self, begin):
+        conn = self.acquire()
+        clean = False  # Whether the transaction ended, so the connection can be reused
+        try:
+            conn.execute(begin)
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                clean = True
+                raise
+            conn.execute("COMMIT")
+            clean = True
+        finally:
+            if clean:
+                self.release(conn)
+            else:
+                self.discard(conn)
+
+    def read(self):
+        return self._transaction("BEGIN")
+
+    def write(self):
+        return self._transaction("BEGIN IMMEDIATE")
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.created -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self.condition:
+            return {"size": self.size, "open": self.created, "idle": len(self.idle), "waits": self.waits}
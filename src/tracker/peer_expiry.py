@@ -0,0 +1,56 @@
+# File: peer_expiry.py
+import heapq
+import threading
+
+class PeerExpiry:
+    """Min-heap of peer expiry deadlines, so stale peers are found without scanning every swarm.
+
+    Each announce pushes a new (deadline, last_seen, torrent_hash, peer_id) entry; entries left
+    behind by a later announce are skipped when they reach the top, and the heap is
+    rebuilt once such leftovers outnumber the live entries.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}  # (torrent_hash, peer_id) -> (last_seen, deadline) of the peer's latest announce
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def touch(self, torrent_hash, peer_id, last_seen, deadline):
+        with self.lock:
+            current = self.entries.get((torrent_hash, peer_id))
+            if current is not None and current[0] > last_seen:
+                # An older announce finishing late; its last_seen would never match the stored peer
+                return
+            self.entries[(torrent_hash, peer_id)] = (last_seen, deadline)
+            heapq.heappush(self.heap, (deadline, last_seen, torrent_hash, peer_id))
+            if len(self.heap) > 2 * len(self.entries) + 1024:
+                self.heap = [(deadline, last_seen, torrent_hash, peer_id)
+                             for (torrent_hash, peer_id), (last_seen, deadline) in self.entries.items()]
+                heapq.heapify(self.heap)
+
+    def retry(self, expired, deadline):
+        """Put back popped peers whose removal failed, unless they announced meanwhile."""
+        with self.lock:
+            for torrent_hash, peer_id, last_seen in expired:
+                if (torrent_hash, peer_id) not in self.entries:
+                    self.entries[(torrent_hash, peer_id)] = (last_seen, deadline)
+                    heapq.heappush(self.heap, (deadline, last_seen, torrent_hash, peer_id))
+
+    def pop_expired(self, now, limit):
+        """Up to limit (torrent_hash, peer_id, last_seen) of peers whose deadline passed, oldest first.
+
+        last_seen is that of the announce the deadline came from; callers drop a peer only if
+        its record still has it, so an announce racing with the expiry keeps the peer.
+        """
+        expired = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now and len(expired) < limit:
+                deadline, last_seen, torrent_hash, peer_id = heapq.heappop(self.heap)
+                key = (torrent_hash, peer_id)
+                if self.entries.get(key) == (last_seen, deadline):
+                    del self.entries[key]
+                    expired.append((torrent_hash, peer_id, last_seen))
+        return expired
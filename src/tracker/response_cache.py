@@ -0,0 +1,80 @@
+# File: response_cache.py
+import time
+import random
+import threading
+
+class SwarmSample:
+    """Random seeders and leechers of one torrent, read once and shared by the announces that follow."""
+
+    def __init__(self, seeders, leechers, size, expires):
+        self.seeders = seeders
+        self.leechers = leechers
+        self.size = size
+        self.expires = expires
+
+    def sample(self, seeders, count, exclude=None):
+        """Up to count random records of one side other than exclude."""
+        records = self.seeders if seeders else self.leechers
+        picked = random.sample(records, min(count + 1, len(records)))
+        return [peer for peer in picked if peer["peer_id"] != exclude][:count]
+
+class ResponseCache:
+    """Per-torrent SwarmSamples for the "sqlite" storage mode, kept for ttl seconds.
+
+    A torrent's sample is dropped as soon as a peer joins, leaves or switches between seeding
+    and leeching. Each drop bumps the torrent's generation, and put() ignores samples read
+    under an older one, so a read racing with a membership change never gets cached.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.samples = {}  # torrent_hash -> SwarmSample
+        self.generations = {}  # torrent_hash -> membership changes seen, only for torrents that had any
+        self.epoch = 0  # Bumped whenever generations is cleared, so no generation is ever seen twice
+        self.purge_at = 1024  # Cached torrents at which expired samples are swept out
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, torrent_hash):
+        """(cached SwarmSample or None, generation to pass to put() after a miss)."""
+        with self.lock:
+            sample = self.samples.get(torrent_hash)
+            if sample is not None and sample.expires > time.monotonic():
+                self.hits += 1
+                return sample, None
+            self.misses += 1
+            return None, (self.epoch, self.generations.get(torrent_hash, 0))
+
+    def put(self, torrent_hash, generation, seeders, leechers, size):
+        sample = SwarmSample(seeders, leechers, size, time.monotonic() + self.ttl)
+        with self.lock:
+            if (self.epoch, self.generations.get(torrent_hash, 0)) == generation:
+                self.samples[torrent_hash] = sample
+                if len(self.samples) >= self.purge_at:
+                    self._purge()
+        return sample
+
+    def invalidate(self, torrent_hashes):
+        with self.lock:
+            for torrent_hash in torrent_hashes:
+                self.generations[torrent_hash] = self.generations.get(torrent_hash, 0) + 1
+                if self.samples.pop(torrent_hash, None) is not None:
+                    self.invalidations += 1
+            # The generations of quiet torrents are dropped once they pile up
+            if len(self.generations) > 2 * len(self.samples) + 1024:
+                self._purge()
+                self.generations = {}
+                self.epoch += 1
+
+    def _purge(self):
+        now = time.monotonic()
+        self.samples = {torrent_hash: sample for torrent_hash, sample in self.samples.items() if sample.expires > now}
+        self.purge_at = 2 * len(self.samples) + 1024
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                    "hit_rate": self.hits / lookups if lookups else 0, "torrents": len(self.samples)}
@@ -0,0 +1,46 @@
+# File: scrape_counters.py
+import threading
+
+COUNT_SQL = """
+    SELECT t.torrent_hash, COALESCE(SUM(p.seeding), 0), COUNT(p.peer_id) - COALESCE(SUM(p.seeding), 0), t.completed
+    FROM torrents t LEFT JOIN peers p ON p.torrent_hash = t.torrent_hash
+    GROUP BY t.torrent_hash
+"""
+
+class ScrapeCounters:
+    """Per-torrent scrape counts for the "sqlite" storage mode, kept in memory.
+
+    complete and incomplete count seeding and leeching peers, downloaded counts completed
+    events. The announce writer and the stale-peer cleanup apply their changes as deltas
+    inside their write transactions, so the counts change in the same order as the tables
+    and a scrape never reads the database.
+    """
+
+    def __init__(self):
+        self.counts = {}  # torrent_hash -> [complete, incomplete, downloaded]
+        self.lock = threading.Lock()
+
+    def recount(self, conn):
+        """Count everything from the tables, at startup or after a failed commit left the deltas in doubt."""
+        rows = conn.execute(COUNT_SQL).fetchall()
+        with self.lock:
+            self.counts = {torrent_hash: [complete, incomplete, downloaded]
+                           for torrent_hash, complete, incomplete, downloaded in rows}
+
+    def apply(self, torrent_hash, complete=0, incomplete=0, downloaded=0):
+        with self.lock:
+            counts = self.counts.setdefault(torrent_hash, [0, 0, 0])
+            counts[0] += complete
+            counts[1] += incomplete
+            counts[2] += downloaded
+
+    def drop(self, torrent_hashes):
+        with self.lock:
+            for torrent_hash in torrent_hashes:
+                self.counts.pop(torrent_hash, None)
+
+    def get(self, torrent_hash):
+        """(complete, incomplete, downloaded) of a torrent, None if the tracker does not know it."""
+        with self.lock:
+            counts = self.counts.get(torrent_hash)
+            return tuple(counts) if counts is not None else None
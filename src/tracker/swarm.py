@@ -0,0 +1,228 @@
+# File: swarm.py
+import heapq
+import random
+import threading
+import logging
+from src.tracker.config import LEECHER_SEEDER_SHARE, FAST_PEER_OVERSAMPLE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def fastest(candidates, count):
+    """The count candidates with the highest reported upload rate."""
+    if len(candidates) <= count:
+        return candidates
+    return heapq.nlargest(count, candidates, key=lambda peer: peer["upload_rate"])
+
+def choose_peers(sample, count, seeding):
+    """Peers for one announce, where sample(seeders, n) draws up to n random candidates from one side.
+
+    Seeders only get leechers, as they have nothing to gain from each other. Leechers get
+    LEECHER_SEEDER_SHARE seeders, with either side filling slots the other cannot. Each side
+    draws FAST_PEER_OVERSAMPLE times the candidates it needs and keeps the fastest uploaders.
+    """
+    if seeding:
+        return fastest(sample(False, count * FAST_PEER_OVERSAMPLE), count)
+    seeders = sample(True, count * FAST_PEER_OVERSAMPLE)
+    leechers = sample(False, count * FAST_PEER_OVERSAMPLE)
+    seeder_count = max(min(round(count * LEECHER_SEEDER_SHARE), len(seeders)), count - len(leechers))
+    chosen = fastest(seeders, seeder_count) + fastest(leechers, count - seeder_count)
+    random.shuffle(chosen)
+    return chosen
+
+class PeerPool:
+    """Records of the seeders or the leechers of a swarm, for random sampling in time proportional to the sample."""
+
+    def __init__(self):
+        self.records = []
+        self.positions = {}  # peer_id -> index in records
+
+    def __len__(self):
+        return len(self.records)
+
+    def put(self, peer):
+        peer_id = peer["peer_id"]
+        if peer_id in self.positions:
+            self.records[self.positions[peer_id]] = peer
+        else:
+            self.positions[peer_id] = len(self.records)
+            self.records.append(peer)
+
+    def remove(self, peer_id):
+        position = self.positions.pop(peer_id, None)
+        if position is None:
+            return
+        # Move the last record into the gap so removal stays O(1)
+        last = self.records.pop()
+        if position < len(self.records):
+            self.records[position] = last
+            self.positions[last["peer_id"]] = position
+
+    def sample(self, count, exclude=None):
+        """Up to count random records other than exclude."""
+        picked = random.sample(self.records, min(count + 1, len(self.records)))
+        return [peer for peer in picked if peer["peer_id"] != exclude][:count]
+
+class Swarm:
+    """Peers of one torrent, behind a lock of their own so announces for different torrents never contend."""
+
+    def __init__(self, torrent_hash, total_downloaded=0, total_uploaded=0, completed=0):
+        self.torrent_hash = torrent_hash
+        self.peers = {}  # peer_id -> peer record with the columns of the peers table
+        self.seeders = PeerPool()  # The same records split by their seeding flag
+        self.leechers = PeerPool()
+        self.total_downloaded = total_downloaded
+        self.total_uploaded = total_uploaded
+        self.completed = completed  # Completed events ever announced, the scrape "downloaded" count
+        self.lock = threading.Lock()
+        self.dirty = False  # Changed since the last snapshot
+        self.closed = False  # Dropped from the registry, announces must look the torrent up again
+
+    def put(self, peer):
+        # Records are replaced, never mutated, so returned lists stay consistent without the lock
+        peer_id = peer["peer_id"]
+        previous = self.peers.get(peer_id)
+        if previous is not None and previous["seeding"] != peer["seeding"]:
+            (self.seeders if previous["seeding"] else self.leechers).remove(peer_id)
+        (self.seeders if peer["seeding"] else self.leechers).put(peer)
+        self.peers[peer_id] = peer
+
+    def remove(self, peer_id):
+        peer = self.peers.pop(peer_id, None)
+        if peer is not None:
+            (self.seeders if peer["seeding"] else self.leechers).remove(peer_id)
+
+    def announce(self, peer, event, numwant):
+        """Apply one announce and return (up to numwant other peers, swarm size), or None if the swarm was dropped."""
+        with self.lock:
+            if self.closed:
+                return None
+            if event == 'stopped':
+                self.remove(peer["peer_id"])
+            else:
+                self.put(peer)
+                if event == 'completed' or event == 'started':
+                    self.total_downloaded += peer["downloaded"]
+                    self.total_uploaded += peer["uploaded"]
+                if event == 'completed':
+                    self.completed += 1
+            self.dirty = True
+            sample = lambda seeders, count: (self.seeders if seeders else self.leechers).sample(count, peer["peer_id"])
+            return choose_peers(sample, numwant, peer["seeding"]), len(self.peers)
+
+class SwarmRegistry:
+    """In-memory swarms of every torrent, the tracker's "memory" storage.
+
+    The registry lock only guards adding and dropping swarms; announces lock their own swarm.
+    Changes are collected by the tracker's snapshot thread and written to SQLite in bulk.
+    """
+
+    def __init__(self):
+        self.swarms = {}  # torrent_hash -> Swarm
+        self.removed = set()  # Torrents whose swarm was dropped since the last snapshot
+        self.lock = threading.Lock()
+
+    def get(self, torrent_hash):
+        swarm = self.swarms.get(torrent_hash)
+        if swarm is None:
+            with self.lock:
+                swarm = self.swarms.get(torrent_hash)
+                if swarm is None:
+                    swarm = self.swarms[torrent_hash] = Swarm(torrent_hash)
+                    self.removed.discard(torrent_hash)
+        return swarm
+
+    def announce(self, torrent_hash, peer, event, numwant):
+        while True:
+            result = self.get(torrent_hash).announce(peer, event, numwant)
+            if result is not None:
+                return result
+
+    def peers(self, torrent_hash):
+        """Current peers of a torrent, None if the tracker has no swarm for it."""
+        swarm = self.swarms.get(torrent_hash)
+        if swarm is None:
+            return None
+        with swarm.lock:
+            return list(swarm.peers.values())
+
+    def scrape(self, torrent_hash):
+        """(complete, incomplete, downloaded) of a torrent, None if the tracker has no swarm for it."""
+        swarm = self.swarms.get(torrent_hash)
+        if swarm is None:
+            return None
+        with swarm.lock:
+            return len(swarm.seeders), len(swarm.leechers), swarm.completed
+
+    def torrents(self):
+        """torrent_hash -> (total_downloaded, total_uploaded, peers) for every swarm."""
+        result = {}
+        for swarm in list(self.swarms.values()):
+            with swarm.lock:
+                result[swarm.torrent_hash] = (swarm.total_downloaded, swarm.total_uploaded, list(swarm.peers.values()))
+        return result
+
+    def expire(self, expired):
+        """Drop (torrent_hash, peer_id, last_seen) peers not seen since and their swarms left empty.
+
+        Returns the (torrent_hash, peer_id) pairs dropped.
+        """
+        by_torrent = {}
+        for torrent_hash, peer_id, last_seen in expired:
+            by_torrent.setdefault(torrent_hash, []).append((peer_id, last_seen))
+        dropped = []
+        for torrent_hash, peers in by_torrent.items():
+            swarm = self.swarms.get(torrent_hash)
+            if swarm is None:
+                continue
+            with swarm.lock:
+                for peer_id, last_seen in peers:
+                    peer = swarm.peers.get(peer_id)
+                    if peer is not None and peer["last_seen"] == last_seen:
+                        swarm.remove(peer_id)
+                        swarm.dirty = True
+                        dropped.append((torrent_hash, peer_id))
+                if swarm.peers:
+                    continue
+            with self.lock, swarm.lock:
+                if not swarm.peers and self.swarms.get(torrent_hash) is swarm:
+                    swarm.closed = True
+                    del self.swarms[torrent_hash]
+                    self.removed.add(torrent_hash)
+        return dropped
+
+    def load(self, torrents, peers):
+        """Restore swarms from a snapshot.
+
+        torrents are (hash, total_downloaded, total_uploaded, completed) rows, peers (hash, record) pairs.
+        """
+        with self.lock:
+            for torrent_hash, total_downloaded, total_uploaded, completed in torrents:
+                self.swarms[torrent_hash] = Swarm(torrent_hash, total_downloaded, total_uploaded, completed)
+        for torrent_hash, peer in peers:
+            self.get(torrent_hash).put(peer)
+
+    def collect_changes(self):
+        """Take the swarms changed and the torrents dropped since the last call.
+
+        Returns ([(torrent_hash, total_downloaded, total_uploaded, completed, peers)], removed hashes).
+        """
+        with self.lock:
+            removed, self.removed = self.removed, set()
+            swarms = list(self.swarms.values())
+        changed = []
+        for swarm in swarms:
+            with swarm.lock:
+                if swarm.dirty and not swarm.closed:
+                    swarm.dirty = False
+                    changed.append((swarm.torrent_hash, swarm.total_downloaded, swarm.total_uploaded, swarm.completed,
+                                    list(swarm.peers.values())))
+        return changed, removed
+
+    def restore_changes(self, changed, removed):
+        """Put back changes whose snapshot failed so the next one retries them."""
+        with self.lock:
+            self.removed |= {torrent_hash for torrent_hash in removed if torrent_hash not in self.swarms}
+            for torrent_hash, *_ in changed:
+                swarm = self.swarms.get(torrent_hash)
+                if swarm is not None:
+                    swarm.dirty = True
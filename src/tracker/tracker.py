@@ -2,33 +2,126 @@
 import threading
 import logging
 import time
-import sqlite3
-from flask import Flask, request, jsonify
+import socket
+import struct
+import bencodepy
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from src.tracker.config import (TRACKER_STORAGE, SNAPSHOT_INTERVAL, DEFAULT_NUMWANT, MAX_NUMWANT,
+                                BASE_ANNOUNCE_INTERVAL, INTERVAL_SWARM_SIZE, TARGET_ANNOUNCE_RATE,
+                                MAX_ANNOUNCE_INTERVAL, MAX_SCRAPE_HASHES, MAX_BATCH_ANNOUNCES, PEER_TTL_INTERVALS,
+                                PEER_TTL_GRACE, EXPIRY_BATCH_SIZE, EXPIRY_CHECK_INTERVAL, RESPONSE_CACHE_TTL,
+                                RESPONSE_CACHE_POOL)
+from src.tracker.swarm import SwarmRegistry, choose_peers
+from src.tracker.db_pool import ConnectionPool
+from src.tracker.announce_writer import AnnounceWriter
+from src.tracker.scrape_counters import ScrapeCounters
+from src.tracker.peer_expiry import PeerExpiry
+from src.tracker.response_cache import ResponseCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+PEER_FIELDS = ("peer_id", "ip", "port", "event", "downloaded", "uploaded", "download_rate", "upload_rate", "seeding")
+
+SELECT_SWARM_SQL = """
+    SELECT peer_id, ip, port, event, downloaded, uploaded, download_rate, upload_rate, seeding
+    FROM peers WHERE torrent_hash = ? AND seeding = ? ORDER BY RANDOM() LIMIT ?
+"""
+COUNT_SWARM_SQL = "SELECT COUNT(*) FROM peers WHERE torrent_hash = ?"
+SELECT_EXPIRED_SQL = "SELECT seeding FROM peers WHERE peer_id = ? AND torrent_hash = ? AND last_seen = ?"
+DELETE_EXPIRED_SQL = "DELETE FROM peers WHERE peer_id = ? AND torrent_hash = ? AND last_seen = ?"
+DELETE_EMPTY_TORRENT_SQL = """
+    DELETE FROM torrents WHERE torrent_hash = ?
+    AND NOT EXISTS (SELECT 1 FROM peers WHERE peers.torrent_hash = torrents.torrent_hash)
+"""
+
+def announce_interval(swarm_size, announce_rate):
+    """Seconds a peer should wait before its next announce, and the least it must wait.
+
+    The interval grows with the swarm, as big swarms stay connected without fresh peer lists,
+    and with tracker load above TARGET_ANNOUNCE_RATE, so total announce traffic levels off.
+    """
+    interval = BASE_ANNOUNCE_INTERVAL * max(1.0, swarm_size / INTERVAL_SWARM_SIZE)
+    interval *= max(1.0, announce_rate / TARGET_ANNOUNCE_RATE)
+    interval = int(min(interval, MAX_ANNOUNCE_INTERVAL))
+    return interval, interval // 2
+
+def peer_ttl(interval):
+    """Seconds after its last announce that a peer told to announce every interval seconds is dropped."""
+    return interval * PEER_TTL_INTERVALS + PEER_TTL_GRACE
+
+def compact_address(ip, port):
+    """6-byte IPv4 (BEP 23) or 18-byte IPv6 (BEP 7) form of a peer address."""
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    return socket.inet_pton(family, ip) + struct.pack(">H", port)
+
+def announce_reply(peers, compact, interval, min_interval):
+    """Reply to one announce: a JSON-ready dict, or a dict of packed addresses to bencode when compact was asked for."""
+    if not compact:
+        return {
+            'interval': interval,
+            'min interval': min_interval,
+            'peers': [{field: p[field] for field in PEER_FIELDS} for p in peers]
+        }
+    addresses = [p["compact"] for p in peers]
+    return {
+        b"interval": interval,
+        b"min interval": min_interval,
+        b"peers": b"".join(address for address in addresses if len(address) == 6),
+        b"peers6": b"".join(address for address in addresses if len(address) == 18)
+    }
+
+def encode_response(reply, compact):
+    if not compact:
+        return jsonify(reply), 200
+    return Response(bencodepy.encode(reply), mimetype="application/octet-stream"), 200
+
 class Tracker:
-    def __init__(self, db_path="torrent.db"):
+    def __init__(self, db_path="torrent.db", storage=TRACKER_STORAGE):
+        if storage not in ("sqlite", "memory"):
+            raise ValueError(f"Unknown tracker storage: {storage}")
         self.app = Flask(__name__)
         CORS(self.app)
         self.db_path = db_path
+        self.db = ConnectionPool(db_path)
         self.announce_count = 0
+        self.announce_rate = 0.0  # Announces per second over the last measuring window
+        self.rate_count = 0
+        self.rate_started = time.monotonic()
         self.lock = threading.Lock()
+        # In "memory" mode swarms live here and SQLite only holds periodic snapshots
+        self.swarms = SwarmRegistry() if storage == "memory" else None
         self.setup_database()
+        if self.swarms:
+            self.load_snapshot()
+        # In "sqlite" mode announces are written through group commits, which keep the scrape counts
+        # up to date and drop the cached peer samples of swarms whose membership changed
+        self.counters = None
+        self.cache = None
+        self.writer = None
+        if not self.swarms:
+            self.counters = ScrapeCounters()
+            with self.db.read() as conn:
+                self.counters.recount(conn)
+            self.cache = ResponseCache(RESPONSE_CACHE_TTL)
+            self.writer = AnnounceWriter(self.db, self.counters, self.cache)
+        # Deadlines after which peers that stopped announcing are dropped
+        self.expiry = PeerExpiry()
+        self.load_expiry()
         self.setup_routes()
 
         # In tracker.py, modify the database setup
     def setup_database(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self.db.write() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS torrents (
                     torrent_hash TEXT PRIMARY KEY,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     total_downloaded BIGINT DEFAULT 0,
-                    total_uploaded BIGINT DEFAULT 0
+                    total_uploaded BIGINT DEFAULT 0,
+                    completed INTEGER DEFAULT 0
                 )
             """)
             cursor.execute("""
@@ -54,126 +147,369 @@ class Tracker:
             columns = [col[1] for col in cursor.fetchall()]
             if 'seeding' not in columns:
                 cursor.execute("ALTER TABLE peers ADD COLUMN seeding BOOLEAN DEFAULT 0")
-            
-            conn.commit()
+            cursor.execute("PRAGMA table_info(torrents)")
+            if 'completed' not in [col[1] for col in cursor.fetchall()]:
+                cursor.execute("ALTER TABLE torrents ADD COLUMN completed INTEGER DEFAULT 0")
+
+            # The primary key starts with peer_id, so swarm lookups need their own index; stale peers
+            # are deleted by key as their expiry deadlines pass, so last_seen needs none
+            cursor.execute("DROP INDEX IF EXISTS idx_peers_torrent_hash")
+            cursor.execute("DROP INDEX IF EXISTS idx_peers_last_seen")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_peers_torrent_seeding ON peers (torrent_hash, seeding)")
+
+            # Torrents whose last peer stopped before a restart have no expiry deadline left to drop them
+            cursor.execute("DELETE FROM torrents WHERE NOT EXISTS (SELECT 1 FROM peers WHERE peers.torrent_hash = torrents.torrent_hash)")
         logging.info("Database initialized")
 
     def setup_routes(self):
         @self.app.route('/announce', methods=['GET'])
         def announce():
             try:
-                peer_id = request.args.get('peer_id')
-                torrent_hash = request.args.get('torrent_hash')
-                port = request.args.get('port')
-                event = request.args.get('event', '')
-                ip = request.remote_addr
-                
-                # Get download/upload statistics
-                downloaded = int(request.args.get('downloaded', 0))
-                uploaded = int(request.args.get('uploaded', 0))
-                download_rate = float(request.args.get('download_rate', 0))
-                upload_rate = float(request.args.get('upload_rate', 0))
-                
-                # Add seeding flag to better identify seeders
-                seeding = request.args.get('seeding', 'false').lower() == 'true'
-                
-                # If download rate is near zero and has downloaded data, likely a seeder
-                if download_rate < 0.1 and downloaded > 0 and event == 'started':
-                    seeding = True
-        
-                logging.info(f"Announce: peer_id={peer_id}, torrent_hash={torrent_hash}, ip={ip}, port={port}, "
-                            f"event={event}, down_rate={download_rate:.2f}, up_rate={upload_rate:.2f}, seeding={seeding}")
-        
-                with self.lock:
-                    self.announce_count += 1
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.cursor()
-                        # Insert torrent if not exists
-                        cursor.execute("INSERT OR IGNORE INTO torrents (torrent_hash) VALUES (?)", (torrent_hash,))
-                        
-                        if event == 'stopped':
-                            cursor.execute("DELETE FROM peers WHERE peer_id = ? AND torrent_hash = ?", (peer_id, torrent_hash))
-                        else:
-                            # Update peer with rate information and seeding flag
-                            cursor.execute("""
-                                INSERT OR REPLACE INTO peers 
-                                (peer_id, torrent_hash, ip, port, event, last_seen, downloaded, uploaded, download_rate, upload_rate, seeding)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            """, (peer_id, torrent_hash, ip, int(port) if port.isdigit() else 0, event, time.time(),
-                                  downloaded, uploaded, download_rate, upload_rate, seeding))
-                            
-                            # Update torrent totals
-                            if event == 'completed' or event == 'started':
-                                cursor.execute("""
-                                    UPDATE torrents SET 
-                                    total_downloaded = total_downloaded + ?,
-                                    total_uploaded = total_uploaded + ?
-                                    WHERE torrent_hash = ?
-                                """, (downloaded, uploaded, torrent_hash))
-                        
-                        # Get peers for this torrent with additional information
-                        cursor.execute("""
-                            SELECT peer_id, ip, port, event, downloaded, uploaded, download_rate, upload_rate, seeding
-                            FROM peers WHERE torrent_hash = ?
-                        """, (torrent_hash,))
-                        
-                        peers = [{
-                            "peer_id": row[0], 
-                            "ip": row[1], 
-                            "port": row[2], 
-                            "event": row[3],
-                            "downloaded": row[4],
-                            "uploaded": row[5],
-                            "download_rate": row[6],
-                            "upload_rate": row[7],
-                            "seeding": bool(row[8]) if len(row) > 8 else False
-                        } for row in cursor.fetchall()]
-                        
-                        conn.commit()
-        
-                    response = {'peers': peers}
-                    return jsonify(response), 200
+                torrent_hash, peer, event, numwant = self.parse_announce(request.args, request.remote_addr)
+                compact = request.args.get('compact', '0') == '1'
+                logging.info(f"Announce: peer_id={peer['peer_id']}, torrent_hash={torrent_hash}, ip={peer['ip']}, "
+                             f"port={peer['port']}, event={event}, down_rate={peer['download_rate']:.2f}, "
+                             f"up_rate={peer['upload_rate']:.2f}, seeding={peer['seeding']}")
+                announce_rate = self.count_announce()
+                if self.swarms:
+                    peers, swarm_size = self.swarms.announce(torrent_hash, peer, event, numwant)
+                else:
+                    peers, swarm_size = self.announce_sqlite(torrent_hash, peer, event, numwant)
+                interval, min_interval = announce_interval(swarm_size, announce_rate)
+                self.track_expiry(torrent_hash, peer, event, interval)
+
+                return encode_response(announce_reply(peers, compact, interval, min_interval), compact)
             except Exception as e:
                 logging.error(f"Announce error: {e}")
                 return jsonify({'error': str(e)}), 500
-        @self.app.route('/scrape', methods=['GET'])
+        @self.app.route('/announce_batch', methods=['POST'])
+        def announce_batch():
+            # {"peer_id", "port", "numwant", "compact", "torrents": [{"torrent_hash", "event", ...}]}, where
+            # each torrent takes the announce parameters and falls back to the top-level ones
+            try:
+                body = request.get_json(silent=True) or {}
+                entries = body.get('torrents', [])
+                if not isinstance(entries, list) or len(entries) > MAX_BATCH_ANNOUNCES:
+                    return jsonify({'error': f'torrents must be a list of at most {MAX_BATCH_ANNOUNCES} announces'}), 400
+                defaults = {key: value for key, value in body.items() if key != 'torrents'}
+                try:
+                    announces = [self.parse_announce({**defaults, **entry}, request.remote_addr) for entry in entries]
+                except (ValueError, TypeError) as e:
+                    return jsonify({'error': f'Bad announce in batch: {e}'}), 400
+                compact = str(body.get('compact', '0')).lower() in ('1', 'true')
+                logging.info(f"Batch announce of {len(announces)} torrents from {request.remote_addr}")
+                announce_rate = self.count_announce(len(announces))
+                if self.swarms:
+                    results = []
+                    for torrent_hash, peer, event, numwant in announces:
+                        try:
+                            results.append(self.swarms.announce(torrent_hash, peer, event, numwant))
+                        except Exception as e:
+                            results.append(e)
+                else:
+                    results = self.announce_sqlite_many(announces)
+                torrents = {}
+                for (torrent_hash, peer, event, _), result in zip(announces, results):
+                    if isinstance(result, Exception):
+                        logging.error(f"Batch announce error for {torrent_hash}: {result}")
+                        reply = {b'failure reason': str(result).encode()} if compact else {'failure reason': str(result)}
+                    else:
+                        peers, swarm_size = result
+                        interval, min_interval = announce_interval(swarm_size, announce_rate)
+                        self.track_expiry(torrent_hash, peer, event, interval)
+                        reply = announce_reply(peers, compact, interval, min_interval)
+                    torrents[torrent_hash.encode() if compact else torrent_hash] = reply
+                return encode_response({b'torrents' if compact else 'torrents': torrents}, compact)
+            except Exception as e:
+                logging.error(f"Batch announce error: {e}")
+                return jsonify({'error': str(e)}), 500
+        @self.app.route('/scrape', methods=['GET', 'POST'])
         def scrape():
+            # Any number of torrents: torrent_hash repeated in the query, or POST {"torrent_hashes": [...]}
             try:
-                torrent_hash = request.args.get('torrent_hash')
-                with self.lock:
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("SELECT event FROM peers WHERE torrent_hash = ?", (torrent_hash,))
-                        rows = cursor.fetchall()
-                        if rows:
-                            complete = sum(1 for row in rows if row[0] == 'completed')
-                            incomplete = len(rows) - complete
-                            return jsonify({
-                                'complete': complete,
-                                'incomplete': incomplete,
-                                'peers': len(rows)
-                            }), 200
+                torrent_hashes = request.args.getlist('torrent_hash')
+                if request.method == 'POST':
+                    torrent_hashes += (request.get_json(silent=True) or {}).get('torrent_hashes', [])
+                files = {}
+                for torrent_hash in torrent_hashes[:MAX_SCRAPE_HASHES]:
+                    counts = self.swarms.scrape(torrent_hash) if self.swarms else self.counters.get(torrent_hash)
+                    if counts is not None:
+                        complete, incomplete, downloaded = counts
+                        files[torrent_hash] = {
+                            'complete': complete,
+                            'incomplete': incomplete,
+                            'downloaded': downloaded,
+                            'peers': complete + incomplete
+                        }
+                if len(torrent_hashes) == 1:
+                    # A single torrent is answered with its counts at the top level, as before
+                    if not files:
                         return jsonify({'error': 'Torrent not found'}), 404
+                    return jsonify(files[torrent_hashes[0]]), 200
+                return jsonify({'files': files}), 200
             except Exception as e:
                 logging.error(f"Scrape error: {e}")
                 return jsonify({'error': str(e)}), 500
 
-    def cleanup_peers(self):
+    def parse_announce(self, args, ip):
+        """(torrent_hash, peer record, event, numwant) from the parameters of one announce."""
+        peer_id = args.get('peer_id')
+        torrent_hash = args.get('torrent_hash')
+        if not peer_id or not torrent_hash:
+            raise ValueError("peer_id and torrent_hash are required")
+        port = str(args.get('port', ''))
+        event = args.get('event', '')
+
+        # Get download/upload statistics
+        downloaded = int(args.get('downloaded', 0))
+        uploaded = int(args.get('uploaded', 0))
+        download_rate = float(args.get('download_rate', 0))
+        upload_rate = float(args.get('upload_rate', 0))
+
+        # Add seeding flag to better identify seeders
+        seeding = str(args.get('seeding', 'false')).lower() == 'true'
+
+        # Peers wanted in the response
+        numwant = min(max(int(args.get('numwant', DEFAULT_NUMWANT)), 0), MAX_NUMWANT)
+
+        # If download rate is near zero and has downloaded data, likely a seeder
+        if download_rate < 0.1 and downloaded > 0 and event == 'started':
+            seeding = True
+
+        peer = {
+            "peer_id": peer_id,
+            "ip": ip,
+            "port": int(port) if port.isdigit() else 0,
+            "event": event,
+            "last_seen": time.time(),
+            "downloaded": downloaded,
+            "uploaded": uploaded,
+            "download_rate": download_rate,
+            "upload_rate": upload_rate,
+            "seeding": seeding
+        }
+        peer["compact"] = compact_address(ip, peer["port"])
+        return torrent_hash, peer, event, numwant
+
+    def count_announce(self, count=1):
+        """Count announces and return the recent announce rate."""
+        with self.lock:
+            self.announce_count += count
+            self.rate_count += count
+            now = time.monotonic()
+            if now - self.rate_started >= 10:
+                self.announce_rate = self.rate_count / (now - self.rate_started)
+                self.rate_count = 0
+                self.rate_started = now
+            return self.announce_rate
+
+    def track_expiry(self, torrent_hash, peer, event, interval):
+        """Give an announced peer a deadline following the interval it was told.
+
+        A stopped peer is already gone, its short deadline only brings the cleanup back to drop the torrent if empty.
+        """
+        ttl = PEER_TTL_GRACE if event == 'stopped' else peer_ttl(interval)
+        self.expiry.touch(torrent_hash, peer["peer_id"], peer["last_seen"], peer["last_seen"] + ttl)
+
+    def load_expiry(self):
+        """Deadlines for the peers already stored, by the interval their swarm gets on an idle tracker."""
+        with self.db.read() as conn:
+            rows = conn.execute("""
+                SELECT p.torrent_hash, p.peer_id, p.last_seen, s.size FROM peers p
+                JOIN (SELECT torrent_hash, COUNT(*) AS size FROM peers GROUP BY torrent_hash) s USING (torrent_hash)
+            """).fetchall()
+        for torrent_hash, peer_id, last_seen, swarm_size in rows:
+            self.expiry.touch(torrent_hash, peer_id, last_seen, last_seen + peer_ttl(announce_interval(swarm_size, 0)[0]))
+
+    def announce_sqlite(self, torrent_hash, peer, event, numwant):
+        """Record an announce in the database and return up to numwant other peers of the torrent and its size."""
+        self.writer.write(torrent_hash, peer, event)
+        return self.choose_sqlite(self.swarm_sample(torrent_hash), peer, numwant)
+
+    def announce_sqlite_many(self, announces):
+        """Record (torrent_hash, peer, event, numwant) announces in one group commit, then answer each.
+
+        Returns a (peers, swarm size) pair or the exception raised for every announce.
+        """
+        self.writer.write_many([(torrent_hash, peer, event) for torrent_hash, peer, event, _ in announces])
+        results = []
+        with self.db.read() as conn:
+            for torrent_hash, peer, _, numwant in announces:
+                try:
+                    results.append(self.choose_sqlite(self.swarm_sample(torrent_hash, conn), peer, numwant))
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def choose_sqlite(self, sample, peer, numwant):
+        return choose_peers(lambda seeders, count: sample.sample(seeders, count, peer["peer_id"]),
+                            numwant, peer["seeding"]), sample.size
+
+    def swarm_sample(self, torrent_hash, conn=None):
+        """Random seeders and leechers of a torrent and its size, from the response cache when fresh."""
+        sample, generation = self.cache.get(torrent_hash)
+        if sample is not None:
+            return sample
+        if conn is None:
+            with self.db.read() as conn:
+                return self.read_sample(conn, torrent_hash, generation)
+        return self.read_sample(conn, torrent_hash, generation)
+
+    def read_sample(self, conn, torrent_hash, generation):
+        """Draw a fresh sample of up to RESPONSE_CACHE_POOL seeders and leechers and cache it."""
+        def read(seeders):
+            rows = conn.execute(SELECT_SWARM_SQL, (torrent_hash, seeders, RESPONSE_CACHE_POOL)).fetchall()
+            return [{
+                "peer_id": row[0],
+                "ip": row[1],
+                "port": row[2],
+                "event": row[3],
+                "downloaded": row[4],
+                "uploaded": row[5],
+                "download_rate": row[6],
+                "upload_rate": row[7],
+                "seeding": bool(row[8]) if len(row) > 8 else False,
+                "compact": compact_address(row[1], row[2])
+            } for row in rows]
+
+        swarm_size = conn.execute(COUNT_SWARM_SQL, (torrent_hash,)).fetchone()[0]
+        return self.cache.put(torrent_hash, generation, read(True), read(False), swarm_size)
+
+    def load_snapshot(self):
+        """Fill the in-memory swarms from the last snapshot, leaving out peers that went stale meanwhile."""
+        with self.db.read() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT torrent_hash, total_downloaded, total_uploaded, completed FROM torrents")
+            torrents = cursor.fetchall()
+            cursor.execute("""
+                SELECT torrent_hash, peer_id, ip, port, event, last_seen, downloaded, uploaded, download_rate, upload_rate, seeding
+                FROM peers WHERE last_seen >= ?
+            """, (time.time() - 3600,))
+            peers = [(row[0], {
+                "peer_id": row[1],
+                "ip": row[2],
+                "port": row[3],
+                "event": row[4],
+                "last_seen": row[5],
+                "downloaded": row[6],
+                "uploaded": row[7],
+                "download_rate": row[8],
+                "upload_rate": row[9],
+                "seeding": bool(row[10]),
+                "compact": compact_address(row[2], row[3])
+            }) for row in cursor.fetchall()]
+        self.swarms.load(torrents, peers)
+        logging.info(f"Loaded {len(torrents)} torrents and {len(peers)} peers from snapshot")
+
+    def save_snapshot(self):
+        """Write the in-memory swarms changed since the last snapshot to SQLite in one transaction."""
+        changed, removed = self.swarms.collect_changes()
+        if not changed and not removed:
+            return
+        try:
+            with self.db.write() as conn:
+                cursor = conn.cursor()
+                for torrent_hash in removed:
+                    cursor.execute("DELETE FROM peers WHERE torrent_hash = ?", (torrent_hash,))
+                    cursor.execute("DELETE FROM torrents WHERE torrent_hash = ?", (torrent_hash,))
+                for torrent_hash, total_downloaded, total_uploaded, completed, peers in changed:
+                    cursor.execute("""
+                        INSERT INTO torrents (torrent_hash, total_downloaded, total_uploaded, completed) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(torrent_hash) DO UPDATE SET
+                        total_downloaded = excluded.total_downloaded,
+                        total_uploaded = excluded.total_uploaded,
+                        completed = excluded.completed
+                    """, (torrent_hash, total_downloaded, total_uploaded, completed))
+                    cursor.execute("DELETE FROM peers WHERE torrent_hash = ?", (torrent_hash,))
+                    cursor.executemany("""
+                        INSERT INTO peers
+                        (peer_id, torrent_hash, ip, port, event, last_seen, downloaded, uploaded, download_rate, upload_rate, seeding)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, [(p["peer_id"], torrent_hash, p["ip"], p["port"], p["event"], p["last_seen"], p["downloaded"],
+                           p["uploaded"], p["download_rate"], p["upload_rate"], p["seeding"]) for p in peers])
+            logging.debug(f"Snapshot saved: {len(changed)} swarms changed, {len(removed)} removed")
+        except Exception:
+            self.swarms.restore_changes(changed, removed)
+            raise
+
+    def snapshot_swarms(self):
         while True:
+            time.sleep(SNAPSHOT_INTERVAL)
             try:
-                with self.lock:
-                    with sqlite3.connect(self.db_path) as conn:
-                        cursor = conn.cursor()
-                        cursor.execute("DELETE FROM peers WHERE last_seen < ?", (time.time() - 3600,))
-                        cursor.execute("DELETE FROM torrents WHERE NOT EXISTS (SELECT 1 FROM peers WHERE peers.torrent_hash = torrents.torrent_hash)")
-                        conn.commit()
-                        logging.debug("Cleaned up stale peers")
+                self.save_snapshot()
             except Exception as e:
-                logging.error(f"Cleanup error: {e}")
-            time.sleep(300)
+                logging.error(f"Snapshot error: {e}")
+
+    def cleanup_peers(self):
+        """Drop peers as their expiry deadlines pass, at most EXPIRY_BATCH_SIZE per transaction."""
+        while True:
+            expired = self.expiry.pop_expired(time.time(), EXPIRY_BATCH_SIZE)
+            if expired:
+                try:
+                    dropped = self.swarms.expire(expired) if self.swarms else self.expire_sqlite(expired)
+                    logging.debug(f"Cleaned up {len(dropped)} stale peers")
+                except Exception as e:
+                    logging.error(f"Cleanup error: {e}")
+                    self.expiry.retry(expired, time.time() + EXPIRY_CHECK_INTERVAL)
+            if len(expired) < EXPIRY_BATCH_SIZE:
+                time.sleep(EXPIRY_CHECK_INTERVAL)
+
+    def expire_sqlite(self, expired):
+        """Delete (torrent_hash, peer_id, last_seen) peers not seen since and their torrents left empty.
+
+        Returns the (torrent_hash, peer_id) pairs deleted.
+        """
+        dropped = []
+        with self.db.write() as conn:
+            for torrent_hash, peer_id, last_seen in expired:
+                row = conn.execute(SELECT_EXPIRED_SQL, (peer_id, torrent_hash, last_seen)).fetchone()
+                if row is None:
+                    continue
+                conn.execute(DELETE_EXPIRED_SQL, (peer_id, torrent_hash, last_seen))
+                self.counters.apply(torrent_hash, *((-1, 0) if row[0] else (0, -1)))
+                dropped.append((torrent_hash, peer_id))
+            emptied = [torrent_hash for torrent_hash in {torrent_hash for torrent_hash, _, _ in expired}
+                       if conn.execute(DELETE_EMPTY_TORRENT_SQL, (torrent_hash,)).rowcount]
+            self.counters.drop(emptied)
+        self.cache.invalidate({torrent_hash for torrent_hash, _ in dropped})
+        return dropped
+
+    def stats(self):
+        """Announce counts, and the group commit and response cache statistics of the "sqlite" mode."""
+        stats = {"announces": self.announce_count, "announce_rate": self.announce_rate}
+        if self.writer:
+            stats["writer"] = self.writer.stats()
+            stats["response_cache"] = self.cache.stats()
+        return stats
 
     def get_torrents(self):
-        with sqlite3.connect(self.db_path) as conn:
+        # Define activity threshold (e.g., 60 seconds)
+        activity_threshold = time.time() - 60
+        if self.swarms:
+            torrents = {}
+            for torrent_hash, (total_downloaded, total_uploaded, peers) in self.swarms.torrents().items():
+                torrents[torrent_hash] = {
+                    "total_downloaded": total_downloaded,
+                    "total_uploaded": total_uploaded,
+                    "peers": {}
+                }
+                for peer in peers:
+                    # Reset rates to zero if peer hasn't been seen recently
+                    is_active = peer["last_seen"] > activity_threshold
+                    torrents[torrent_hash]["peers"][peer["peer_id"]] = {
+                        'peer_id': peer["peer_id"],
+                        'ip': peer["ip"],
+                        'port': peer["port"],
+                        'event': peer["event"],
+                        'last_seen': peer["last_seen"],
+                        'downloaded': peer["downloaded"],
+                        'uploaded': peer["uploaded"],
+                        'download_rate': peer["download_rate"] if is_active else 0,
+                        'upload_rate': peer["upload_rate"] if is_active else 0
+                    }
+            return torrents
+
+        with self.db.read() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT torrent_hash, total_downloaded, total_uploaded FROM torrents")
             torrents = {row[0]: {
@@ -182,9 +518,6 @@ class Tracker:
                 "peers": {}
             } for row in cursor.fetchall()}
             
-            # Define activity threshold (e.g., 60 seconds)
-            activity_threshold = time.time() - 60
-            
             cursor.execute("""
                 SELECT torrent_hash, peer_id, ip, port, event, last_seen, 
                        downloaded, uploaded, download_rate, upload_rate 
@@ -216,8 +549,17 @@ class Tracker:
 
     def run(self, host='0.0.0.0', port=8000):
         threading.Thread(target=self.cleanup_peers, daemon=True).start()
+        if self.swarms:
+            threading.Thread(target=self.snapshot_swarms, daemon=True).start()
         logging.info(f"Starting tracker on {host}:{port}")
-        self.app.run(host=host, port=port, debug=False, use_reloader=False)
+        try:
+            self.app.run(host=host, port=port, debug=False, use_reloader=False)
+        finally:
+            if self.swarms:
+                self.save_snapshot()
+            else:
+                self.writer.stop()
+            self.db.close()
 
 if __name__ == "__main__":
     tracker = Tracker()
@@ -280,7 +280,11 @@ class TrackerGUI:
                     # Update summary labels
                     self.peer_count.config(text=f"Peers: {peer_count}")
                     self.torrent_count.config(text=f"Torrents: {len(torrents)}")
-                    self.announce_label.config(text=f"Announces: {self.tracker.announce_count}")
+                    stats = self.tracker.stats()
+                    announces = f"Announces: {stats['announces']} ({stats['announce_rate']:.1f}/s)"
+                    if "response_cache" in stats:
+                        announces += f" | Cache hits: {stats['response_cache']['hit_rate']:.0%}"
+                    self.announce_label.config(text=announces)
                     self.bandwidth_label.config(text=f"Total: {total_download_rate:.2f} KB/s ↓ | {total_upload_rate:.2f} KB/s ↑")
                     
                     # Rest of the graph update code...
@@ -15,6 +15,8 @@ import logging
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.peer.client import Client
 from src.peer.torrent_maker import create_torrent_file
+from src.peer.config import HASH_CACHE_PATH
+from src.peer.hashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -93,19 +95,21 @@ class TorrentGUI:
 
         self.peers_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.peers_tab, text="Peers")
-        self.peers_tree = ttk.Treeview(self.peers_tab, columns=("IP", "Port", "DownPieces", "DownSpeed", "UpPieces", "UpSpeed"), show="headings")
+        self.peers_tree = ttk.Treeview(self.peers_tab, columns=("IP", "Port", "DownPieces", "DownSpeed", "UpPieces", "UpSpeed", "Status"), show="headings")
         self.peers_tree.heading("IP", text="IP Address")
         self.peers_tree.heading("Port", text="Port")
         self.peers_tree.heading("DownPieces", text="Down Pieces")
         self.peers_tree.heading("DownSpeed", text="Down Speed (KB/s)")
         self.peers_tree.heading("UpPieces", text="Up Pieces")
         self.peers_tree.heading("UpSpeed", text="Up Speed (KB/s)")
+        self.peers_tree.heading("Status", text="Status")
         self.peers_tree.column("IP", width=150)
         self.peers_tree.column("Port", width=80)
         self.peers_tree.column("DownPieces", width=100)
         self.peers_tree.column("DownSpeed", width=100)
         self.peers_tree.column("UpPieces", width=100)
         self.peers_tree.column("UpSpeed", width=100)
+        self.peers_tree.column("Status", width=100)
         self.peers_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         self.peers_scroll = ttk.Scrollbar(self.peers_tab, orient=tk.VERTICAL, command=self.peers_tree.yview)
         self.peers_tree.configure(yscrollcommand=self.peers_scroll.set)
@@ -257,7 +261,7 @@ class TorrentGUI:
     def create_torrent(self):
         dialog = tk.Toplevel(self.root)
         dialog.title("Create Torrent")
-        dialog.geometry("400x350")  # Increased height for port selection
+        dialog.geometry("400x530")  # Increased height for port selection
         
         ttk.Label(dialog, text="Select Files:").pack(pady=5)
         files_list = tk.Listbox(dialog, selectmode=tk.MULTIPLE, height=5)
@@ -284,6 +288,22 @@ class TorrentGUI:
         port_entry.pack(side=tk.LEFT)
         ttk.Label(port_frame, text="(1024-65535)").pack(side=tk.LEFT, padx=5)
         
+        ttk.Label(dialog, text="Piece Size:").pack(pady=5)
+        piece_sizes = {"Auto": None}
+        piece_sizes.update({f"{size // 1024} KB" if size < 1024 * 1024 else f"{size // 1024 // 1024} MB": size
+                            for size in (256 * 1024 * 2 ** i for i in range(7))})
+        piece_size_var = tk.StringVar(value="Auto")
+        ttk.Combobox(dialog, textvariable=piece_size_var, values=list(piece_sizes), state="readonly", width=10).pack(pady=5)
+        
+        ttk.Label(dialog, text="Piece Hash:").pack(pady=5)
+        hash_var = tk.StringVar(value=DEFAULT_HASH_ALGORITHM)
+        ttk.Combobox(dialog, textvariable=hash_var, values=list(HASH_ALGORITHMS), state="readonly", width=10).pack(pady=5)
+        
+        pad_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(dialog, text="Align files to pieces (pad files)", variable=pad_var).pack(pady=5)
+        merkle_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(dialog, text="Verify each block (Merkle hashes)", variable=merkle_var).pack(pady=5)
+        
         def create():
             files = [files_list.get(i) for i in files_list.curselection()]
             if not files:
@@ -305,8 +325,16 @@ class TorrentGUI:
                 
             save_path = filedialog.asksaveasfilename(defaultextension=".torrent")
             if save_path:
+                def show_progress(hashed_bytes, total_bytes, bytes_per_second):
+                    percent = hashed_bytes / total_bytes * 100 if total_bytes else 100
+                    self.status_bar.config(text=f"Hashing pieces: {percent:.1f}% ({bytes_per_second / 1024 / 1024:.1f} MB/s)")
+                    self.root.update_idletasks()
+                
                 try:
-                    torrent_path = create_torrent_file(files, tracker, save_path)
+                    torrent_path = create_torrent_file(files, tracker, save_path, progress_callback=show_progress,
+                                                       hash_cache=HASH_CACHE_PATH, pad_files=pad_var.get(),
+                                                       piece_size=piece_sizes[piece_size_var.get()],
+                                                       merkle=merkle_var.get(), hash_algorithm=hash_var.get())
                     time.sleep(0.5)
                     result = messagebox.askyesno("Success", 
                                                 f"Torrent created: {torrent_path}\n\nWould you like to add and seed it now?")
@@ -532,6 +560,8 @@ class TorrentGUI:
             pieces_done = sum(client.piece_manager.have_pieces)
             total_pieces = client.piece_manager.total_pieces
             for file_info in client.metainfo["files"]:
+                if file_info.get("pad"):
+                    continue
                 file_name = file_info["path"]
                 file_path = os.path.join(base_path, file_name)
                 size_mb = file_info["length"] / 1024 / 1024
@@ -607,8 +637,14 @@ class TorrentGUI:
                     self.peers_tree.insert("", tk.END, values=(
                         stats.ip, stats.port,
                         stats.pieces_downloaded, f"{stats.get_download_speed():.2f}",
-                        stats.pieces_uploaded, f"{stats.get_upload_speed():.2f}"
+                        stats.pieces_uploaded, f"{stats.get_upload_speed():.2f}",
+                        client.ban_list.status(peer_id)
                     ))
+                # Banned peers drop out of peer_stats once idle, keep them listed while the ban lasts
+                for peer_id, ip, port in client.ban_list.banned_peers():
+                    if peer_id not in client.peer_stats:
+                        self.peers_tree.insert("", tk.END, values=(ip, port, 0, "0.00", 0, "0.00",
+                                                                   client.ban_list.status(peer_id)))
 
                 self.update_files_list()
                 self.status_bar.config(text="Running..." if self.running else "Idle")